@@ -1,18 +1,30 @@
 """Chat API routes using LangGraph chat graph."""
 
-import json
 import logging
+import uuid
 from fastapi import APIRouter, Query
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse
 from langchain_core.messages import HumanMessage
+from sse_starlette.sse import EventSourceResponse
 
+from api.common import build_config
+from api.sse import START_FRAME, ContentEvent, ContentMetadata, encode_event, end_frame, pump
 from graphs.chat_graph import graph as chat_graph
 
-# 设置日志
+# 设置日志（全局日志配置统一在 main.py 中完成）
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-router = APIRouter(prefix="/chat", tags=["chat"])
+# JSON 响应统一用 orjson 渲染
+router = APIRouter(prefix="/chat", tags=["chat"], default_response_class=ORJSONResponse)
+
+
+def _initial_state(text: str) -> dict:
+    """Build the graph input for a single user message.
+
+    A fresh HumanMessage is created on every call: ``add_messages`` assigns an
+    id to the message in place, so the object cannot be shared across requests.
+    """
+    return {"messages": [HumanMessage(content=text)]}
 
 
 @router.get("/")
@@ -31,12 +43,10 @@ async def chat_endpoint(
     """
     try:
         # Create initial state with user message
-        initial_state = {
-            "messages": [HumanMessage(content=message)]
-        }
+        initial_state = _initial_state(message)
         
         # Create config with thread_id for conversation memory
-        config = {"configurable": {"thread_id": thread_id}}
+        config = build_config(thread_id)
         
         # Invoke the chat graph and get final result
         result = await chat_graph.ainvoke(initial_state, config)
@@ -51,23 +61,29 @@ async def chat_endpoint(
         }
         
     except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "response": "抱歉，处理您的请求时出现了错误。"
-        }
+        # 直接构造 ORJSONResponse，跳过 jsonable_encoder；同时返回正确的 500 状态码
+        return ORJSONResponse(
+            {
+                "success": False,
+                "error": str(e),
+                "response": "抱歉，处理您的请求时出现了错误。"
+            },
+            status_code=500
+        )
 
 
 @router.get("/stream")
 async def chat_stream_endpoint(
     message: str = Query(..., description="User input message"),
-    thread_id: str = Query("default", description="Thread ID for conversation memory")
+    thread_id: str = Query("default", description="Thread ID for conversation memory"),
+    debug: bool = Query(False, description="Include raw LangGraph metadata in content events")
 ):
     """
     Streaming chat endpoint using official LangGraph streaming.
     
     Query parameter:
     - message: user input text
+    - debug: attach the full LangGraph metadata to every content event
     
     Returns:
     - Server-Sent Events (SSE) stream of chat response tokens
@@ -75,30 +91,24 @@ async def chat_stream_endpoint(
     
     async def generate_chat_stream():
         try:
-            logger.info(f"开始流式聊天请求: {message[:50]}...")
+            logger.info("开始流式聊天请求: %.50s...", message)
             
             # Send start signal
-            start_data = {
-                'type': 'start', 
-                'content': '', 
-                'metadata': {'node': 'system', 'step': 0}
-            }
-            yield f"data: {json.dumps(start_data)}\n\n"
+            yield START_FRAME
             
             # Create initial state with user message
-            initial_state = {
-                "messages": [HumanMessage(content=message)]
-            }
-            logger.info(f"创建初始状态，消息数量: {len(initial_state['messages'])}")
+            initial_state = _initial_state(message)
+            logger.info("创建初始状态，消息数量: %d", len(initial_state['messages']))
             
             # Use LangGraph's official streaming with stream_mode="messages"
             logger.info("使用 LangGraph 官方流式输出模式")
             
-            accumulated_content = ""
+            # 只需要累计长度，不保留拼接后的完整文本
+            accumulated_length = 0
             chunk_count = 0
             
             # Create config with thread_id for conversation memory
-            config = {"configurable": {"thread_id": thread_id}}
+            config = build_config(thread_id)
             
             # Stream using LangGraph's official streaming API
             async for message_chunk, metadata in chat_graph.astream(
@@ -107,36 +117,36 @@ async def chat_stream_endpoint(
                 stream_mode="messages"
             ):
                 # Check if the message chunk has content
-                if hasattr(message_chunk, 'content') and message_chunk.content:
-                    logger.info(f"获取了LLM消息: {message_chunk.content}")
+                content = getattr(message_chunk, 'content', None)
+                if content:
                     chunk_count += 1
-                    accumulated_content += message_chunk.content
+                    accumulated_length += len(content)
                     
                     # Send the streaming token
-                    chunk_data = {
-                        'type': 'content',
-                        'content': message_chunk.content,
-                        'metadata': {
-                            'node': metadata.get('langgraph_node', 'unknown'),
-                            'chunk_number': chunk_count,
-                            'accumulated_length': len(accumulated_content),
-                            'langgraph_metadata': metadata
+                    node = metadata.get('langgraph_node', 'unknown')
+                    if debug:
+                        # 完整的 LangGraph metadata 体积远大于 token 本身，仅在调试时附带
+                        chunk_data = {
+                            'type': 'content',
+                            'content': content,
+                            'metadata': {
+                                'node': node,
+                                'chunk_number': chunk_count,
+                                'accumulated_length': accumulated_length,
+                                'langgraph_metadata': metadata
+                            }
                         }
-                    }
-                    yield f"data: {json.dumps(chunk_data)}\n\n"
-                    logger.info(f"发送流式 token {chunk_count}: '{message_chunk.content}' (节点: {metadata.get('langgraph_node', 'unknown')})")
+                    else:
+                        # slots dataclass 由 orjson 直接序列化，省去每个 token 的嵌套 dict 分配
+                        chunk_data = ContentEvent(content, ContentMetadata(node, chunk_count, accumulated_length))
+                    yield encode_event(chunk_data)
+                    # 逐 token 日志只在 DEBUG 下输出，避免热路径上的格式化开销
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("发送流式 token %d: %r (节点: %s)", chunk_count, content, node)
             
             # Send completion signal
-            end_data = {
-                'type': 'end',
-                'content': '',
-                'metadata': {
-                    'total_chunks': chunk_count,
-                    'total_length': len(accumulated_content)
-                }
-            }
-            yield f"data: {json.dumps(end_data)}\n\n"
-            logger.info(f"流式输出完成，总共 {chunk_count} 个 token，总长度: {len(accumulated_content)} 字符")
+            yield end_frame(chunk_count, accumulated_length)
+            logger.info("流式输出完成，总共 %d 个 token，总长度: %d 字符", chunk_count, accumulated_length)
             
         except Exception as e:
             # Send error signal
@@ -146,18 +156,12 @@ async def chat_stream_endpoint(
                 'content': error_msg, 
                 'metadata': {'node': 'system', 'error': True}
             }
-            yield f"data: {json.dumps(error_data)}\n\n"
-            logger.error(f"流式聊天出错: {str(e)}", exc_info=True)
+            yield encode_event(error_data)
+            logger.error("流式聊天出错: %s", e, exc_info=True)
     
-    return StreamingResponse(
-        generate_chat_stream(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-        }
-    )
+    # EventSourceResponse sets the SSE headers and sends a keep-alive ping every 15s;
+    # pump() runs the graph in its own task so slow client writes don't stall token production
+    return EventSourceResponse(pump(generate_chat_stream()), ping=15)
 
 
 @router.get("/test")
@@ -167,12 +171,18 @@ async def test_chat_endpoint():
     
     try:
         # Create initial state with test message
-        initial_state = {
-            "messages": [HumanMessage(content=test_message)]
-        }
+        initial_state = _initial_state(test_message)
         
-        # Invoke the chat graph
-        result = await chat_graph.ainvoke(initial_state)
+        # Invoke the chat graph on a fresh thread (the checkpointer requires a
+        # thread_id) so test calls never accumulate history; throwaway ids
+        # bypass the build_config cache
+        thread_id = str(uuid.uuid4())
+        config = {"configurable": {"thread_id": thread_id}}
+        try:
+            result = await chat_graph.ainvoke(initial_state, config)
+        finally:
+            # 测试线程用完即删，不占用 checkpointer 的线程名额
+            await chat_graph.checkpointer.adelete_thread(thread_id)
         
         return {
             "success": True,
@@ -182,8 +192,11 @@ async def test_chat_endpoint():
         }
         
     except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "test_message": test_message
-        }
+        return ORJSONResponse(
+            {
+                "success": False,
+                "error": str(e),
+                "test_message": test_message
+            },
+            status_code=500
+        )
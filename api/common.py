@@ -0,0 +1,13 @@
+"""Helpers shared by the graph routers."""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1024)
+def build_config(thread_id: str) -> dict:
+    """Return the (cached) graph config for ``thread_id``.
+
+    LangGraph copies ``configurable`` when merging configs and never mutates
+    the dict we pass in, so the same object can be reused across requests.
+    """
+    return {"configurable": {"thread_id": thread_id}}
@@ -1,24 +1,78 @@
 import logging
+from functools import singledispatch
 from typing import Optional, Dict, Any
-import json
-import asyncio
 
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
 
-from langgraph.types import Command
+from langgraph.types import Command, Interrupt
 from langgraph.errors import GraphInterrupt
 
+from api.common import build_config
+from api.sse import START_FRAME, ContentEvent, ContentMetadata, encode_event, end_frame, pump
 from graphs.customize_state_graph import graph
 
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 设置日志（全局日志配置统一在 main.py 中完成）
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/customize-state", tags=["customize-state"])
 
+# 内容固定的事件帧，模块加载时预先编码，避免每次请求重复构建 dict 与序列化
+_TOOL_RUNNING_FRAME = encode_event({'type': 'tool_running', 'content': '🔧 正在执行工具...', 'metadata': {'node': 'tools'}})
+_AI_DECISION_FRAME = encode_event({'type': 'ai_decision', 'content': '🤖 AI决定调用工具', 'metadata': {'node': 'chatbot'}})
+
+# updates 流中表示人工中断的节点名
+_INTERRUPT_NODES = frozenset({"__interrupt__", "interrupt", "graph:interrupt"})
+
+
+@singledispatch
+def _interrupt_value(node_output: Any) -> Any:
+    """按中断输出的类型取出 interrupt() 的原始值；未知类型返回 None。"""
+    return None
+
+
+@_interrupt_value.register
+def _(node_output: Interrupt) -> Any:
+    return node_output.value
+
+
+@_interrupt_value.register
+def _(node_output: dict) -> Any:
+    return node_output.get("value")
+
+
+@_interrupt_value.register(list)
+@_interrupt_value.register(tuple)
+def _(node_output) -> Any:
+    # updates 流中 __interrupt__ 的值是 Interrupt 序列，只取第一个
+    return _interrupt_value(node_output[0]) if node_output else None
+
+
+def _extract_interrupt_payload(node_output: Any) -> Optional[Dict[str, Any]]:
+    """
+    从中断输出（Interrupt 序列、单个 Interrupt 或 {"value": ...} 字典）中取出 interrupt() 的负载。
+    取不到字典负载时返回 None。
+    """
+    payload = _interrupt_value(node_output)
+    return payload if isinstance(payload, dict) else None
+
+
+def _build_resume_command(correct: Optional[str], name: Optional[str], birthday: Optional[str]) -> Command:
+    """
+    构造恢复执行用的 Command：correct 非空时传递确认结果，name/birthday 提供时作为修正。
+    若三者都未提供，则默认视为确认无误，避免工具中出现 KeyError。
+    """
+    resume_payload: Dict[str, Any] = {}
+    if correct:
+        resume_payload["correct"] = correct
+    if name is not None:
+        resume_payload["name"] = name
+    if birthday is not None:
+        resume_payload["birthday"] = birthday
+    return Command(resume=resume_payload or {"correct": "y"})
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -42,10 +96,10 @@ async def chat_customize_state(request: ChatRequest) -> Dict[str, Any]:
     - 需要人工审阅：{"intervention_required": True, "thread_id": str, "question": str, "name": str, "birthday": str, "status": "intervention_required"}
     """
     try:
-        config = {"configurable": {"thread_id": request.thread_id}}
+        config = build_config(request.thread_id)
         initial_state = {"messages": [{"role": "user", "content": request.message}]}
 
-        logger.info(f"[customize_state.chat] thread_id={request.thread_id} initial_state={initial_state}")
+        logger.info("[customize_state.chat] thread_id=%s message=%.80s", request.thread_id, request.message)
 
         try:
             result = await graph.ainvoke(initial_state, config)
@@ -65,8 +119,8 @@ async def chat_customize_state(request: ChatRequest) -> Dict[str, Any]:
 
         except GraphInterrupt as e:
             # 捕获 human_assistance 工具触发的 interrupt()
-            logger.info(f"[customize_state.chat] GraphInterrupt: {e}")
-            data = e.interrupts[0] if e.interrupts else {}
+            logger.info("[customize_state.chat] GraphInterrupt: %s", e)
+            data = _extract_interrupt_payload(e.interrupts) or {}
             question = data.get("question", "需要人工审阅")
             name = data.get("name", "")
             birthday = data.get("birthday", "")
@@ -93,19 +147,10 @@ async def respond_customize_state(request: HumanReview) -> Dict[str, Any]:
     返回：{"response": str, "thread_id": str, "status": "completed"}
     """
     try:
-        config = {"configurable": {"thread_id": request.thread_id}}
-
-        resume_payload: Dict[str, Any] = {}
-        if request.correct:
-            resume_payload["correct"] = request.correct
-        if request.name is not None:
-            resume_payload["name"] = request.name
-        if request.birthday is not None:
-            resume_payload["birthday"] = request.birthday
+        config = build_config(request.thread_id)
 
-        # 保底：若用户既未提供 correct，也未提供 name/birthday，则仍提供空结构，避免 KeyError
-        human_command = Command(resume=resume_payload or {"correct": "y"})
-        logger.info(f"[customize_state.respond] thread_id={request.thread_id} resume={human_command}")
+        human_command = _build_resume_command(request.correct, request.name, request.birthday)
+        logger.info("[customize_state.respond] thread_id=%s resume=%s", request.thread_id, human_command)
 
         final_msg = None
         async for event in graph.astream(human_command, config, stream_mode="values"):
@@ -129,337 +174,131 @@ async def respond_customize_state(request: HumanReview) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"人工审阅处理失败: {exc}")
 
 
-# ========== SSE 流式端点 ==========
-
-@router.get("/chat/stream")
-async def stream_chat_customize_state(message: str, thread_id: str = "default"):
+async def warmup() -> None:
     """
-    流式对话（SSE）。
-    事件类型：start/content/ai_decision/tool_call/tool_result/intervention_required/end/error
-    与 human_loop_routes.py 对齐，便于前端复用。
+    启动预热：读取一次预热线程的状态，提前完成图配置校验与 checkpointer 的首次访问，
+    避免第一位用户承担冷启动开销。不会调用 LLM；失败时只记录日志。
     """
-    async def generate():
-        logger.info(f"[customize_state.stream_chat] 开始请求: thread_id={thread_id}, message={message[:80]}...")
-        try:
-            # start 事件
-            start_data = {
-                'type': 'start',
-                'content': '',
-                'metadata': {'node': 'system', 'step': 0}
-            }
-            yield f"data: {json.dumps(start_data)}\n\n"
-
-            # 初始化
-            config = {"configurable": {"thread_id": thread_id}}
-            initial_state = {"messages": [{"role": "user", "content": message}]}
-            accumulated_content = ""
-            chunk_count = 0
-            current_node = None
-            tool_decision_sent = False
-
-            logger.info(f"[customize_state.stream_chat] 调用 graph.astream，initial_state={initial_state}")
-
-            try:
-                async for stream_mode, chunk in graph.astream(
-                    initial_state,
-                    config,
-                    stream_mode=["messages", "updates"],
-                ):
-                    if stream_mode == "messages":
-                        message_chunk, metadata = chunk
-                        node_from_metadata = metadata.get('langgraph_node', 'unknown')
-                        # 跳过 tools 节点的消息分片，避免重复/无用内容
-                        if node_from_metadata == "tools":
-                            logger.info(f"[customize_state.stream_chat] 跳过tools消息分片: {getattr(message_chunk, 'content', '')}")
-                            continue
-                        if hasattr(message_chunk, 'content') and message_chunk.content:
-                            logger.info(f"[customize_state.stream_chat] 收到LLM内容分片: {message_chunk.content}")
-                            chunk_count += 1
-                            accumulated_content += message_chunk.content
-                            chunk_data = {
-                                'type': 'content',
-                                'content': message_chunk.content,
-                                'metadata': {
-                                    'node': node_from_metadata,
-                                    'chunk_number': chunk_count,
-                                    'accumulated_length': len(accumulated_content),
-                                    'langgraph_metadata': metadata,
-                                }
-                            }
-                            yield f"data: {json.dumps(chunk_data)}\n\n"
-
-                        # 无论是否有可见content，都检查是否包含工具调用计划
-                        try:
-                            tool_calls = getattr(message_chunk, 'tool_calls', None)
-                        except Exception:
-                            tool_calls = None
-
-                        if node_from_metadata == "chatbot" and tool_calls:
-                            # 记录并宣布AI的工具调用决策
-                            logger.info(f"[customize_state.stream_chat] 🤖 检测到AI决定调用工具: {tool_calls}")
-                            ai_decision_evt = {
-                                'type': 'ai_decision',
-                                'content': 'AI决定调用工具',
-                                'metadata': {
-                                    'node': node_from_metadata,
-                                    'langgraph_metadata': metadata,
-                                }
-                            }
-                            yield f"data: {json.dumps(ai_decision_evt)}\n\n"
-
-                            # 逐个发送具体工具调用事件
-                            for tc in tool_calls:
-                                # 兼容dict与对象两种结构
-                                tool_name = None
-                                tool_args = {}
-                                if isinstance(tc, dict):
-                                    tool_name = tc.get('name') or tc.get('tool')
-                                    tool_args = tc.get('args') or {}
-                                else:
-                                    tool_name = getattr(tc, 'name', None) or getattr(tc, 'tool', None)
-                                    tool_args = getattr(tc, 'args', {}) or {}
-
-                                logger.info(f"[customize_state.stream_chat] 🛠️ 工具调用计划 -> tool={tool_name}, args={tool_args}")
-                                tool_call_evt = {
-                                    'type': 'tool_call',
-                                    'tool': tool_name,
-                                    'args': tool_args,
-                                    'metadata': {
-                                        'node': node_from_metadata,
-                                        'langgraph_metadata': metadata,
-                                    }
-                                }
-                                yield f"data: {json.dumps(tool_call_evt)}\n\n"
-
-                    elif stream_mode == "updates":
-                        for node_name, node_output in chunk.items():
-                            current_node = node_name
-                            logger.info(f"[customize_state.stream_chat] 节点更新 - {node_name}: {str(node_output)}")
-
-                            # 处理中断节点（人工审阅）
-                            if node_name in {"__interrupt__", "interrupt", "graph:interrupt"}:
-                                interrupt_payload = None
-                                try:
-                                    candidate = node_output[0] if isinstance(node_output, (list, tuple)) and node_output else node_output
-                                    if hasattr(candidate, "value"):
-                                        interrupt_payload = candidate.value
-                                    elif isinstance(candidate, dict) and "value" in candidate:
-                                        interrupt_payload = candidate.get("value")
-                                except Exception:
-                                    interrupt_payload = None
-
-                                question = None
-                                name = None
-                                birthday = None
-                                if isinstance(interrupt_payload, dict):
-                                    question = interrupt_payload.get("question")
-                                    name = interrupt_payload.get("name")
-                                    birthday = interrupt_payload.get("birthday")
-                                if not question:
-                                    question = "需要人工审阅"
-
-                                logger.info(f"[customize_state.stream_chat] 检测到中断，question={question} name={name} birthday={birthday}")
-                                evt = {
-                                    'type': 'intervention_required',
-                                    'question': question,
-                                    'name': name,
-                                    'birthday': birthday,
-                                    'thread_id': thread_id,
-                                    'metadata': {'node': node_name}
-                                }
-                                yield f"data: {json.dumps(evt, ensure_ascii=False)}\n\n"
-
-                                end_data = {
-                                    'type': 'end',
-                                    'content': '',
-                                    'metadata': {
-                                        'total_chunks': chunk_count,
-                                        'total_length': len(accumulated_content),
-                                        'final_node': current_node,
-                                    }
-                                }
-                                yield f"data: {json.dumps(end_data)}\n\n"
-                                return
-
-                            if node_name == "tools":
-                                logger.info("[customize_state.stream_chat] 🔧 工具节点执行中...")
-                                # 先发送工具运行中事件，提供更好的用户反馈
-                                running_evt = {
-                                    'type': 'tool_running',
-                                    'content': '🔧 正在执行工具...',
-                                    'metadata': {'node': node_name}
-                                }
-                                yield f"data: {json.dumps(running_evt)}\n\n"
-                                if "messages" in node_output and node_output["messages"]:
-                                    tool_message = node_output["messages"][-1]
-                                    if hasattr(tool_message, 'content'):
-                                        logger.info(f"[customize_state.stream_chat] ✅ 工具执行完成")
-                                        tool_data = {
-                                            'type': 'tool_result',
-                                            'content': '🔧 工具执行完成',
-                                            'result': tool_message.content,
-                                            'metadata': {'node': node_name}
-                                        }
-                                        yield f"data: {json.dumps(tool_data)}\n\n"
-
-                            elif node_name == "chatbot":
-                                if "messages" in node_output and node_output["messages"]:
-                                    ai_message = node_output["messages"][-1]
-                                    if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls and not tool_decision_sent:
-                                        tool_decision_sent = True
-                                        decision_data = {
-                                            'type': 'ai_decision',
-                                            'content': '🤖 AI决定调用工具',
-                                            'metadata': {'node': node_name}
-                                        }
-                                        logger.info(f"[customize_state.stream_chat] 📤 发送AI决策事件: {decision_data}")
-                                        yield f"data: {json.dumps(decision_data)}\n\n"
-                                        await asyncio.sleep(0.01)
-                                        for tool_call in ai_message.tool_calls:
-                                            tool_call_data = {
-                                                'type': 'tool_call',
-                                                'content': f"🔍 准备调用工具: {tool_call.get('name','unknown')}",
-                                                'tool_name': tool_call.get('name','unknown'),
-                                                'tool_args': tool_call.get('args', {}),
-                                                'metadata': {'node': node_name}
-                                            }
-                                            logger.info(f"[customize_state.stream_chat] 📤 发送工具调用事件: {tool_call_data}")
-                                            yield f"data: {json.dumps(tool_call_data)}\n\n"
-                                            await asyncio.sleep(0.01)
-
-                end_data = {
-                    'type': 'end',
-                    'content': '',
-                    'metadata': {
-                        'total_chunks': chunk_count,
-                        'total_length': len(accumulated_content),
-                        'final_node': current_node,
-                    }
-                }
-                logger.info(f"[customize_state.stream_chat] 发送结束事件: {end_data}")
-                yield f"data: {json.dumps(end_data)}\n\n"
-
-            except GraphInterrupt as e:
-                data = e.interrupts[0] if e.interrupts else {}
-                question = data.get("question", "需要人工审阅")
-                name = data.get("name")
-                birthday = data.get("birthday")
-                logger.info(f"[customize_state.stream_chat] 捕获GraphInterrupt: question={question}")
-                yield f"data: {json.dumps({'type':'intervention_required','question':question,'name':name,'birthday':birthday,'thread_id':thread_id}, ensure_ascii=False)}\n\n"
-
-        except Exception as e:
-            logger.error(f"[customize_state.stream_chat] 流式对话失败: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'type':'error','error':str(e)}, ensure_ascii=False)}\n\n"
-
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-        },
-    )
+    try:
+        await graph.aget_state(build_config("__warmup__"))
+    except Exception:
+        logger.warning("[customize_state.warmup] 预热失败", exc_info=True)
 
 
-@router.get("/respond/stream")
-async def stream_respond_customize_state(
+# ========== SSE 流式端点 ==========
+
+async def _stream_graph(
+    graph_input: Any,
+    config: Dict[str, Any],
     thread_id: str,
-    response: Optional[str] = None,
-    correct: Optional[str] = None,
-    name: Optional[str] = None,
-    birthday: Optional[str] = None,
+    log_tag: str,
+    default_question: str,
+    debug: bool = False,
 ):
     """
-    人工回复后流式恢复（SSE）。事件结构与 /chat/stream 对齐。
+    驱动 graph.astream 并产出 SSE 帧，/chat/stream 与 /respond/stream 共用。
+    graph_input 可以是初始 state，也可以是恢复执行用的 Command；debug 为 True 时在 content 事件中附带完整的 LangGraph metadata。
+    注意保持为 async generator 并只用 graph.astream：同步迭代器会被 Starlette 放进线程池逐块执行。
     """
-    async def generate():
-        logger.info(f"[customize_state.respond_stream] 开始流式恢复: thread_id={thread_id}, response={(response[:80] if response else '')}...")
-        try:
-            # start 事件
-            start_data = {'type': 'start', 'content': '', 'metadata': {'node': 'system', 'step': 0}}
-            yield f"data: {json.dumps(start_data)}\n\n"
-
-            config = {"configurable": {"thread_id": thread_id}}
-            # 构造 resume 负载：优先 correct，其次 name/birthday；保留 response 作为备注（不参与 resume）
-            resume_payload: Dict[str, Any] = {}
-            # 使用参数别名，避免后续在闭包中对 name/birthday 的赋值造成遮蔽
-            req_name = name
-            req_birthday = birthday
-            if correct:
-                resume_payload["correct"] = correct
-            if req_name is not None:
-                resume_payload["name"] = req_name
-            if req_birthday is not None:
-                resume_payload["birthday"] = req_birthday
-            human_command = Command(resume=resume_payload or {"correct": "y"})
-            logger.info(
-                f"[customize_state.respond_stream] thread_id={thread_id} resume={resume_payload or {'correct':'y'}}, note={response[:80] if response else ''}"
-            )
-
-            accumulated_content = ""
-            chunk_count = 0
-            current_node = None
-            tool_decision_sent = False
+    try:
+        # start 事件
+        yield START_FRAME
+
+        # 只需要累计长度，不保留拼接后的完整文本
+        accumulated_length = 0
+        chunk_count = 0
+        current_node = None
+        tool_decision_sent = False
 
+        try:
             async for stream_mode, chunk in graph.astream(
-                human_command, config, stream_mode=["messages", "updates"]
+                graph_input,
+                config,
+                stream_mode=["messages", "updates"],
             ):
                 if stream_mode == "messages":
                     message_chunk, metadata = chunk
                     node_from_metadata = metadata.get('langgraph_node', 'unknown')
+                    # 跳过 tools 节点的消息分片，避免重复/无用内容
                     if node_from_metadata == "tools":
-                        logger.info(f"[customize_state.respond_stream] 跳过tools消息分片: {getattr(message_chunk, 'content', '')}")
+                        logger.debug("[customize_state.%s] 跳过tools消息分片", log_tag)
                         continue
-                    if hasattr(message_chunk, 'content') and message_chunk.content:
-                        logger.info(f"[customize_state.respond_stream] 收到LLM内容分片: {message_chunk.content}")
+                    # 每个 token 只做一次属性查找
+                    content = getattr(message_chunk, 'content', None)
+                    if content:
+                        # 逐 token 日志只在 DEBUG 下输出，避免热路径上的格式化开销
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("[customize_state.%s] 收到LLM内容分片: %r", log_tag, content)
                         chunk_count += 1
-                        accumulated_content += message_chunk.content
-                        yield f"data: {json.dumps({'type':'content','content':message_chunk.content,'metadata':{'node':node_from_metadata,'chunk_number':chunk_count,'accumulated_length':len(accumulated_content),'langgraph_metadata':metadata}})}\n\n"
+                        accumulated_length += len(content)
+                        if debug:
+                            # 完整的 LangGraph metadata 体积远大于 token 本身，仅在调试时附带
+                            chunk_data = {
+                                'type': 'content',
+                                'content': content,
+                                'metadata': {
+                                    'node': node_from_metadata,
+                                    'chunk_number': chunk_count,
+                                    'accumulated_length': accumulated_length,
+                                    'langgraph_metadata': metadata,
+                                }
+                            }
+                        else:
+                            chunk_data = ContentEvent(content, ContentMetadata(node_from_metadata, chunk_count, accumulated_length))
+                        yield encode_event(chunk_data)
 
                 elif stream_mode == "updates":
                     for node_name, node_output in chunk.items():
                         current_node = node_name
-                        logger.info(f"[customize_state.respond_stream] 节点更新 - {node_name}: {str(node_output)}")
-
-                        if node_name in {"__interrupt__", "interrupt", "graph:interrupt"}:
-                            interrupt_payload = None
-                            try:
-                                candidate = node_output[0] if isinstance(node_output, (list, tuple)) and node_output else node_output
-                                if hasattr(candidate, "value"):
-                                    interrupt_payload = candidate.value
-                                elif isinstance(candidate, dict) and "value" in candidate:
-                                    interrupt_payload = candidate.get("value")
-                            except Exception:
-                                interrupt_payload = None
-                            question = interrupt_payload.get("question") if isinstance(interrupt_payload, dict) else None
-                            intr_name = interrupt_payload.get("name") if isinstance(interrupt_payload, dict) else None
-                            intr_birthday = interrupt_payload.get("birthday") if isinstance(interrupt_payload, dict) else None
-                            if not question:
-                                question = "需要人工协助"
-                            yield f"data: {json.dumps({'type':'intervention_required','question':question,'name':intr_name,'birthday':intr_birthday,'thread_id':thread_id,'metadata':{'node':node_name}}, ensure_ascii=False)}\n\n"
-                            end_data = {'type':'end','content':'','metadata':{'total_chunks':chunk_count,'total_length':len(accumulated_content),'final_node':current_node}}
-                            yield f"data: {json.dumps(end_data)}\n\n"
+                        logger.debug("[customize_state.%s] 节点更新 - %s: %.250s", log_tag, node_name, node_output)
+
+                        # 处理中断节点（人工审阅）
+                        if node_name in _INTERRUPT_NODES:
+                            interrupt_payload = _extract_interrupt_payload(node_output) or {}
+                            question = interrupt_payload.get("question") or default_question
+                            name = interrupt_payload.get("name")
+                            birthday = interrupt_payload.get("birthday")
+
+                            logger.info("[customize_state.%s] 检测到中断，question=%s name=%s birthday=%s", log_tag, question, name, birthday)
+                            evt = {
+                                'type': 'intervention_required',
+                                'question': question,
+                                'name': name,
+                                'birthday': birthday,
+                                'thread_id': thread_id,
+                                'metadata': {'node': node_name}
+                            }
+
+                            # 中断事件与 end 事件之间没有 await，合并为一次写出
+                            yield encode_event(evt) + end_frame(chunk_count, accumulated_length, current_node)
                             return
 
                         if node_name == "tools":
-                            # 先告知工具正在执行（通用文案，避免与具体联网搜索绑定）
-                            running_evt = {'type':'tool_running','content':'🔧 正在执行工具...','metadata':{'node':node_name}}
-                            yield f"data: {json.dumps(running_evt)}\n\n"
+                            logger.info("[customize_state.%s] 🔧 工具节点执行中...", log_tag)
+                            # 先发送工具运行中事件，提供更好的用户反馈；有结果时与 tool_result 一并写出
+                            frames = _TOOL_RUNNING_FRAME
                             if "messages" in node_output and node_output["messages"]:
                                 tool_message = node_output["messages"][-1]
                                 if hasattr(tool_message, 'content'):
-                                    tool_data = {'type':'tool_result','content':'🔧 工具执行完成','result':tool_message.content,'metadata':{'node':node_name}}
-                                    yield f"data: {json.dumps(tool_data)}\n\n"
+                                    logger.info("[customize_state.%s] ✅ 工具执行完成", log_tag)
+                                    tool_data = {
+                                        'type': 'tool_result',
+                                        'content': '🔧 工具执行完成',
+                                        'result': tool_message.content,
+                                        'metadata': {'node': node_name}
+                                    }
+                                    frames += encode_event(tool_data)
+                            yield frames
 
                         elif node_name == "chatbot":
+                            # 工具调用决策只从完整的 chatbot 更新中提取；messages 分片里的 tool_calls 只是流式片段
                             if "messages" in node_output and node_output["messages"]:
                                 ai_message = node_output["messages"][-1]
                                 if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls and not tool_decision_sent:
                                     tool_decision_sent = True
-                                    decision_data = {'type':'ai_decision','content':'🤖 AI决定调用工具','metadata':{'node':node_name}}
-                                    yield f"data: {json.dumps(decision_data)}\n\n"
-                                    await asyncio.sleep(0.01)
+                                    logger.info("[customize_state.%s] 📤 发送AI决策事件", log_tag)
+                                    # ai_decision 与各 tool_call 事件拼成一次写出
+                                    frames = [_AI_DECISION_FRAME]
                                     for tool_call in ai_message.tool_calls:
                                         tool_call_data = {
                                             'type': 'tool_call',
@@ -468,24 +307,66 @@ async def stream_respond_customize_state(
                                             'tool_args': tool_call.get('args', {}),
                                             'metadata': {'node': node_name}
                                         }
-                                        yield f"data: {json.dumps(tool_call_data)}\n\n"
-                                        await asyncio.sleep(0.01)
-
-            end_data = {'type':'end','content':'','metadata':{'total_chunks':chunk_count,'total_length':len(accumulated_content),'final_node':current_node}}
-            logger.info(f"[customize_state.respond_stream] 流式恢复完成: {str(end_data)}")
-            yield f"data: {json.dumps(end_data)}\n\n"
-
-        except Exception as e:
-            logger.error(f"[customize_state.respond_stream] 流式恢复失败: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
-
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-        },
+                                        logger.debug("[customize_state.%s] 📤 发送工具调用事件: %s", log_tag, tool_call_data)
+                                        frames.append(encode_event(tool_call_data))
+                                    yield b"".join(frames)
+
+            yield end_frame(chunk_count, accumulated_length, current_node)
+
+        except GraphInterrupt as e:
+            data = _extract_interrupt_payload(e.interrupts) or {}
+            question = data.get("question", default_question)
+            name = data.get("name")
+            birthday = data.get("birthday")
+            logger.info("[customize_state.%s] 捕获GraphInterrupt: question=%s", log_tag, question)
+            yield encode_event({'type':'intervention_required','question':question,'name':name,'birthday':birthday,'thread_id':thread_id})
+
+    except Exception as e:
+        logger.error("[customize_state.%s] 流式处理失败: %s", log_tag, e, exc_info=True)
+        yield encode_event({'type':'error','error':str(e)})
+
+
+@router.get("/chat/stream")
+async def stream_chat_customize_state(message: str, thread_id: str = "default", debug: bool = False):
+    """
+    流式对话（SSE）。
+    事件类型：start/content/ai_decision/tool_call/tool_result/intervention_required/end/error
+    与 human_loop_routes.py 对齐，便于前端复用。debug=true 时 content 事件附带完整的 LangGraph metadata。
+    """
+    logger.info("[customize_state.stream_chat] 开始请求: thread_id=%s, message=%.80s...", thread_id, message)
+    config = build_config(thread_id)
+    initial_state = {"messages": [{"role": "user", "content": message}]}
+
+    # EventSourceResponse 负责 data: 分帧、SSE 响应头与每 15s 的保活 ping；
+    # pump() 让图在独立任务中运行，客户端写入慢时不会反压 LLM 流
+    return EventSourceResponse(
+        pump(_stream_graph(initial_state, config, thread_id, "stream_chat", "需要人工审阅", debug)),
+        ping=15,
     )
 
+
+@router.get("/respond/stream")
+async def stream_respond_customize_state(
+    thread_id: str,
+    response: Optional[str] = None,
+    correct: Optional[str] = None,
+    name: Optional[str] = None,
+    birthday: Optional[str] = None,
+    debug: bool = False,
+):
+    """
+    人工回复后流式恢复（SSE）。事件结构与 /chat/stream 对齐。
+    """
+    logger.info("[customize_state.respond_stream] 开始流式恢复: thread_id=%s, response=%.80s...", thread_id, response or '')
+    config = build_config(thread_id)
+    # response 只作为备注记录在日志中，不参与 resume
+    human_command = _build_resume_command(correct, name, birthday)
+    logger.info(
+        "[customize_state.respond_stream] thread_id=%s resume=%s, note=%.80s",
+        thread_id, human_command.resume, response or '',
+    )
+
+    return EventSourceResponse(
+        pump(_stream_graph(human_command, config, thread_id, "respond_stream", "需要人工协助", debug)),
+        ping=15,
+    )
@@ -1,23 +1,25 @@
-import asyncio
+import contextlib
 import logging
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import json
-import uuid
+from sse_starlette.sse import EventSourceResponse
 
 from langgraph.types import Command
 from langgraph.errors import GraphInterrupt
 
+from api.common import build_config
+from api.sse import START_FRAME, ContentEvent, ContentMetadata, encode_event, end_frame, pump
 from graphs.human_loop_graph import graph
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 设置日志（全局日志配置统一在 main.py 中完成）
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/human-loop", tags=["human-loop"])
 
+# updates 流中表示人工中断的节点名
+_INTERRUPT_NODES = frozenset({"__interrupt__", "interrupt", "graph:interrupt"})
+
 class ChatRequest(BaseModel):
     message: str
     thread_id: Optional[str] = "default"
@@ -27,7 +29,32 @@ class HumanResponse(BaseModel):
     response: str
 
 
-    query: Optional[str] = None
+def _extract_interrupt_query(node_output: Any) -> str:
+    """
+    从中断输出（Interrupt 序列、单个 Interrupt 或 {"value": ...} 字典）中取出 query，
+    取不到时返回默认提示。只在中断分支中调用，不影响普通更新的处理路径。
+    """
+    candidate = node_output[0] if isinstance(node_output, (list, tuple)) and node_output else node_output
+    payload = getattr(candidate, "value", None)
+    if payload is None and isinstance(candidate, dict):
+        payload = candidate.get("value")
+    if isinstance(payload, dict) and payload.get("query"):
+        return payload["query"]
+    return "需要人工协助"
+
+
+def _message_text(message: Any) -> str:
+    """
+    取消息的回复文本：优先 content，其次 text（兼容方法与属性两种形式），最后退回 str()。
+    """
+    content = getattr(message, "content", None)
+    if content:
+        return content
+    text = getattr(message, "text", None)
+    if text is None:
+        return str(message)
+    return text() if callable(text) else text
+
 
 @router.post("/chat")
 async def chat_with_human_loop(request: ChatRequest):
@@ -35,45 +62,43 @@ async def chat_with_human_loop(request: ChatRequest):
     启动对话，支持人工干预
     """
     try:
-        config = {"configurable": {"thread_id": request.thread_id}}
+        config = build_config(request.thread_id)
         initial_state = {"messages": [{"role": "user", "content": request.message}]}
         
-        logger.info(f"开始处理对话，thread_id: {request.thread_id}")
+        logger.info("开始处理对话，thread_id: %s, message_len=%d", request.thread_id, len(request.message))
         
         try:
-            # 使用invoke进行阻塞调用，与chat_routes.py保持一致
-            logger.info(f"开始执行图，初始状态: {initial_state}")
-            
-            result = await graph.ainvoke(initial_state, config)
-            
+            logger.debug("开始执行图，初始状态: %s", initial_state)
+
+            # 以 updates 模式执行：中断一出现就立即返回，不必等整张图结束后再回头扫描 tool_calls
+            # aclosing：中断时提前 return 也会立即关闭图的流，不必等 GC 回收挂起的执行
+            final_message = None
+            async with contextlib.aclosing(graph.astream(initial_state, config, stream_mode="updates")) as updates:
+                async for update in updates:
+                    if "__interrupt__" in update:
+                        query = _extract_interrupt_query(update["__interrupt__"])
+                        logger.info("检测到人工干预中断，查询: %s", query)
+
+                        return {
+                            "intervention_required": True,
+                            "thread_id": request.thread_id,
+                            "query": query,
+                            "status": "intervention_required"
+                        }
+
+                    chatbot_update = update.get("chatbot")
+                    if chatbot_update and chatbot_update.get("messages"):
+                        final_message = chatbot_update["messages"][-1]
+
             # 检查最终消息
-            if result and "messages" in result and result["messages"]:
-                final_message = result["messages"][-1]
-                logger.info(f"最终消息: {final_message}")
-                # 检查是否有工具调用（可能需要人工干预）
-                if hasattr(final_message, 'tool_calls') and final_message.tool_calls:
-                    # 检查是否调用了human_assistance工具
-                    for tool_call in final_message.tool_calls:
-                        if tool_call.get('name') == 'human_assistance':
-                            query = tool_call.get('args', {}).get('query', '需要人工协助')
-                            logger.info(f"检测到human_assistance工具调用，查询: {query}")
-                            
-                            return {
-                                "intervention_required": True,
-                                "thread_id": request.thread_id,
-                                "query": query,
-                                "status": "intervention_required"
-                            }
-                
+            if final_message is not None:
+                # 完整消息可能很长，只在 DEBUG 下序列化
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("最终消息: %s", final_message)
+
                 # 正常的AI回复
-                if hasattr(final_message, 'content') and final_message.content:
-                    response_text = final_message.content
-                elif hasattr(final_message, 'text'):
-                    response_text = final_message.text() if callable(final_message.text) else final_message.text
-                else:
-                    response_text = str(final_message)
-                    
-                logger.info(f"返回响应: {response_text}")
+                response_text = _message_text(final_message)
+                logger.info("返回响应: %s", response_text)
                 return {
                     "response": response_text,
                     "thread_id": request.thread_id,
@@ -89,11 +114,10 @@ async def chat_with_human_loop(request: ChatRequest):
             
         except GraphInterrupt as e:
             # 捕获人工干预中断
-            logger.info(f"捕获到人工干预请求: {e}")
+            logger.info("捕获到人工干预请求: %s", e)
             
             # 获取中断信息
-            interrupt_data = e.interrupts[0] if e.interrupts else {}
-            query = interrupt_data.get("query", "需要人工协助")
+            query = _extract_interrupt_query(e.interrupts)
             
             return {
                 "intervention_required": True,
@@ -103,7 +127,7 @@ async def chat_with_human_loop(request: ChatRequest):
             }
             
     except Exception as e:
-        logger.error(f"对话处理失败: {str(e)}")
+        logger.error("对话处理失败: %s", e)
         raise HTTPException(status_code=500, detail=f"对话处理失败: {str(e)}")
 
 @router.post("/respond")
@@ -112,35 +136,33 @@ async def provide_human_response(request: HumanResponse):
     提供人工回复，恢复图执行
     """
     try:
-        config = {"configurable": {"thread_id": request.thread_id}}
+        config = build_config(request.thread_id)
         
         # 创建恢复命令
         human_command = Command(resume={"data": request.response})
         
-        logger.info(f"恢复图执行，thread_id: {request.thread_id}")
+        logger.info("恢复图执行，thread_id: %s, response_len=%d", request.thread_id, len(request.response))
         
         # 恢复执行并获取结果
         final_message = None
-        logger.info(f"恢复执行图，使用命令: {human_command}")
+        logger.debug("恢复执行图，使用命令: %s", human_command)
         
-        async for event in graph.astream(human_command, config, stream_mode="values"):
-            logger.info(f"恢复执行收到事件: {event}")
-            if "messages" in event and event["messages"]:
-                final_message = event["messages"][-1]
-                logger.info(f"恢复执行最新消息: {final_message}")
+        # updates 模式只携带每一步新增的消息，不像 values 模式那样每步都带回完整的历史状态；
+        # 不提前 break，保证最后一步的 checkpoint 正常写入
+        async for event in graph.astream(human_command, config, stream_mode="updates"):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("恢复执行收到事件: %s", event)
+            chatbot_update = event.get("chatbot")
+            if chatbot_update and chatbot_update.get("messages"):
+                final_message = chatbot_update["messages"][-1]
+                logger.debug("恢复执行最新消息: %s", final_message)
         
 
         
         # 检查最终消息
         if final_message:
-            if hasattr(final_message, 'content') and final_message.content:
-                response_text = final_message.content
-            elif hasattr(final_message, 'text'):
-                response_text = final_message.text() if callable(final_message.text) else final_message.text
-            else:
-                response_text = str(final_message)
-                
-            logger.info(f"人工回复处理完成，返回: {response_text}")
+            response_text = _message_text(final_message)
+            logger.info("人工回复处理完成，返回: %s", response_text)
             return {
                 "response": response_text,
                 "thread_id": request.thread_id,
@@ -155,304 +177,172 @@ async def provide_human_response(request: HumanResponse):
             }
         
     except Exception as e:
-        logger.error(f"人工回复处理失败: {str(e)}")
+        logger.error("人工回复处理失败: %s", e)
         raise HTTPException(status_code=500, detail=f"人工回复处理失败: {str(e)}")
 
 
-
-
-
-@router.get("/chat/stream")
-async def stream_chat_with_human_loop(message: str, thread_id: str = "default"):
+async def _stream_graph(graph_input: Any, config: Dict[str, Any], thread_id: str, log_tag: str, debug: bool = False):
     """
-    流式对话，支持人工干预
+    驱动 graph.astream 并产出 SSE 帧，/chat/stream 与 /respond/stream 共用。
+    graph_input 可以是初始 state，也可以是恢复执行用的 Command；debug 为 True 时在 content 事件中附带完整的 LangGraph metadata。
     """
-    async def generate():
-        logger.info(f"开始工具流式请求: {message[:50]}...")
-        try:
-            # start 事件对齐 tool_routes.py
-            start_data = {
-                'type': 'start',
-                'content': '',
-                'metadata': {'node': 'system', 'step': 0}
-            }
-            yield f"data: {json.dumps(start_data)}\n\n"
-
-            # initial_state 与 config
-            config = {"configurable": {"thread_id": thread_id}}
-            initial_state = {"messages": [{"role": "user", "content": message}]}
-
-            # 累积变量对齐 tool_routes.py
-            accumulated_content = ""
-            chunk_count = 0
-            current_node = None
-            tool_decision_sent = False
-
-            logger.info(f"[stream_chat] 调用 graph.astream，initial_state={initial_state}")
-            try:
-                # 同时获取 messages 与 updates
-                async for stream_mode, chunk in graph.astream(
-                    initial_state,
-                    config,
-                    stream_mode=["messages", "updates"]
-                ):
-                    if stream_mode == "messages":
-                        # Handle LLM token streaming（对齐 tool_routes.py）
-                        message_chunk, metadata = chunk
-                        node_from_metadata = metadata.get('langgraph_node', 'unknown')
-                        # 如果来自 tools 节点的消息，则跳过
-                        if node_from_metadata == "tools":
-                            logger.info(f"获取了LLM消息 - 调用工具返回: {getattr(message_chunk, 'content', '')}")
-                            continue
-                        if hasattr(message_chunk, 'content') and message_chunk.content:
-                            logger.info(f"获取了LLM消息: {message_chunk.content}")
-                            chunk_count += 1
-                            accumulated_content += message_chunk.content
-                            # 发送 content 事件（结构对齐）
-                            chunk_data = {
-                                'type': 'content',
-                                'content': message_chunk.content,
-                                'metadata': {
-                                    'node': metadata.get('langgraph_node', 'unknown'),
-                                    'chunk_number': chunk_count,
-                                    'accumulated_length': len(accumulated_content),
-                                    'langgraph_metadata': metadata
-                                }
-                            }
-                            yield f"data: {json.dumps(chunk_data)}\n\n"
-
-                    elif stream_mode == "updates":
-                        # 处理节点更新（对齐 tool_routes.py）
-                        for node_name, node_output in chunk.items():
-                            current_node = node_name
-                            logger.info(f"节点更新 - {node_name}: {str(node_output)}")
-
-                            # 人工干预：LangGraph 在 updates 流中以中断节点形式上报，不一定抛异常
-                            if node_name in {"__interrupt__", "interrupt", "graph:interrupt"}:
-                                # 解析中断负载，兼容 tuple/list/obj 三种形式
-                                interrupt_payload = None
-                                try:
-                                    candidate = None
-                                    if isinstance(node_output, (list, tuple)) and node_output:
-                                        candidate = node_output[0]
-                                    else:
-                                        candidate = node_output
-                                    if hasattr(candidate, "value"):
-                                        interrupt_payload = candidate.value
-                                    elif isinstance(candidate, dict) and "value" in candidate:
-                                        interrupt_payload = candidate.get("value")
-                                except Exception:
-                                    interrupt_payload = None
-
-                                query = None
-                                if isinstance(interrupt_payload, dict):
-                                    query = interrupt_payload.get("query")
-                                if not query:
-                                    query = "需要人工协助"
-
-                                logger.info(f"[stream_chat] 检测到中断节点，触发人工干预，query={query}")
-                                intervention_event = {
-                                    'type': 'intervention_required',
-                                    'query': query,
-                                    'thread_id': thread_id,
-                                    'metadata': {'node': node_name}
-                                }
-                                yield f"data: {json.dumps(intervention_event, ensure_ascii=False)}\n\n"
-
-                                # 发送结束事件并退出流
-                                end_data = {
-                                    'type': 'end',
-                                    'content': '',
-                                    'metadata': {
-                                        'total_chunks': chunk_count,
-                                        'total_length': len(accumulated_content),
-                                        'final_node': current_node
-                                    }
-                                }
-                                yield f"data: {json.dumps(end_data)}\n\n"
-                                return
-
-                            if node_name == "tools":
-                                logger.info("🔧 工具节点正在执行...")
-                                if "messages" in node_output and node_output["messages"]:
-                                    tool_message = node_output["messages"][-1]
-                                    if hasattr(tool_message, 'content'):
-                                        logger.info(f"✅ 工具执行完成: {tool_message.content}")
-                                        tool_data = {
-                                            'type': 'tool_result',
-                                            'content': '🔧 工具执行完成',
-                                            'result': tool_message.content,
-                                            'metadata': {'node': node_name}
-                                        }
-                                        yield f"data: {json.dumps(tool_data)}\n\n"
-
-                            elif node_name == "chatbot":
-                                if "messages" in node_output and node_output["messages"]:
-                                    ai_message = node_output["messages"][-1]
-                                    if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls and not tool_decision_sent:
-                                        logger.info(f"🔍 AI决定调用工具: {[tc.get('name', 'unknown') for tc in ai_message.tool_calls]}")
-                                        tool_decision_sent = True
-                                        decision_data = {
-                                            'type': 'ai_decision',
-                                            'content': '🤖 AI决定调用工具',
-                                            'metadata': {'node': node_name}
-                                        }
-                                        logger.info(f"📤 发送AI决策事件: {decision_data}")
-                                        yield f"data: {json.dumps(decision_data)}\n\n"
-                                        import asyncio
-                                        await asyncio.sleep(0.01)
-
-                                        for tool_call in ai_message.tool_calls:
-                                            tool_call_data = {
-                                                'type': 'tool_call',
-                                                'content': f"🔍 准备调用工具: {tool_call.get('name', 'unknown')}",
-                                                'tool_name': tool_call.get('name', 'unknown'),
-                                                'tool_args': tool_call.get('args', {}),
-                                                'metadata': {'node': node_name}
-                                            }
-                                            logger.info(f"📤 发送工具调用事件: {tool_call_data}")
-                                            yield f"data: {json.dumps(tool_call_data)}\n\n"
-                                            await asyncio.sleep(0.01)
-
-                # end 事件对齐 tool_routes.py
-                end_data = {
-                    'type': 'end',
-                    'content': '',
-                    'metadata': {
-                        'total_chunks': chunk_count,
-                        'total_length': len(accumulated_content),
-                        'final_node': current_node
-                    }
-                }
-                # 一次对话所有trunk输出后执行，可以输出token总数等等信息给前端展示
-                logger.info(f"[stream_chat] 发送结束事件: {end_data}")
-                yield f"data: {json.dumps(end_data)}\n\n"
-            except GraphInterrupt as e:
-                # HITL: 捕获人工干预中断并通知前端
-                interrupt_data = e.interrupts[0] if e.interrupts else {}
-                query = interrupt_data.get("query", "需要人工协助")
-                logger.info(f"[stream_chat] 触发人工干预，query={query}")
-                yield f"data: {json.dumps({'type': 'intervention_required', 'query': query, 'thread_id': thread_id}, ensure_ascii=False)}\n\n"
-
-        except Exception as e:
-            logger.error(f"[stream_chat] 流式对话失败: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
-            logger.debug("[stream_chat] 已发送 error 事件")
-    
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-        },
-    )
+    try:
+        # start 事件对齐 tool_routes.py
+        yield START_FRAME
 
+        # 累积变量对齐 tool_routes.py
+        accumulated_length = 0
+        chunk_count = 0
+        current_node = None
+        tool_decision_sent = False
 
-@router.get("/respond/stream")
-async def stream_respond_with_human_input(response: str, thread_id: str):
-    """
-    人工回复后，流式恢复图执行并返回最终AI回复（SSE）。
-    - 与 /human-loop/chat/stream 的事件结构保持一致：start/content/ai_decision/tool_call/tool_result/intervention_required/end
-    - 避免工具节点消息被拆分为多段：跳过 messages 流中的 tools 节点分片
-    """
-    async def generate():
-        logger.info(f"[respond_stream] 开始人工回复流式恢复: thread_id={thread_id}, response={response[:50]}...")
         try:
-            # start 事件
-            start_data = {'type': 'start', 'content': '', 'metadata': {'node': 'system', 'step': 0}}
-            yield f"data: {json.dumps(start_data)}\n\n"
-
-            config = {"configurable": {"thread_id": thread_id}}
-            human_command = Command(resume={"data": response})
-
-            accumulated_content = ""
-            chunk_count = 0
-            current_node = None
-            tool_decision_sent = False
-
-            # 恢复并以多模式流式返回
+            # 同时获取 messages 与 updates
             async for stream_mode, chunk in graph.astream(
-                human_command, config, stream_mode=["messages", "updates"]
+                graph_input,
+                config,
+                stream_mode=["messages", "updates"]
             ):
                 if stream_mode == "messages":
+                    # Handle LLM token streaming（对齐 tool_routes.py）
                     message_chunk, metadata = chunk
                     node_from_metadata = metadata.get('langgraph_node', 'unknown')
+                    # 如果来自 tools 节点的消息，则跳过
                     if node_from_metadata == "tools":
-                        logger.info(f"[respond_stream] 跳过tools消息分片: {getattr(message_chunk, 'content', '')}")
+                        logger.debug("[%s] 跳过tools消息分片", log_tag)
                         continue
-                    if hasattr(message_chunk, 'content') and message_chunk.content:
-                        logger.info(f"[respond_stream] 收到LLM内容分片: {message_chunk.content}")
+                    # 每个 token 只做一次属性查找
+                    content = getattr(message_chunk, 'content', None)
+                    if content:
+                        # 逐 token 日志只在 DEBUG 下输出，避免热路径上的格式化开销
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("[%s] 收到LLM内容分片: %r", log_tag, content)
                         chunk_count += 1
-                        accumulated_content += message_chunk.content
-                        yield f"data: {json.dumps({'type':'content','content':message_chunk.content,'metadata':{'node':node_from_metadata,'chunk_number':chunk_count,'accumulated_length':len(accumulated_content),'langgraph_metadata':metadata}})}\n\n"
+                        # 只累计长度，不再逐 token 拼接完整文本
+                        accumulated_length += len(content)
+                        # 发送 content 事件（结构对齐）
+                        if debug:
+                            # 完整的 LangGraph metadata 体积远大于 token 本身，仅在调试时附带
+                            chunk_data = {
+                                'type': 'content',
+                                'content': content,
+                                'metadata': {
+                                    'node': node_from_metadata,
+                                    'chunk_number': chunk_count,
+                                    'accumulated_length': accumulated_length,
+                                    'langgraph_metadata': metadata
+                                }
+                            }
+                        else:
+                            chunk_data = ContentEvent(content, ContentMetadata(node_from_metadata, chunk_count, accumulated_length))
+                        yield encode_event(chunk_data)
 
                 elif stream_mode == "updates":
+                    # 处理节点更新（对齐 tool_routes.py）
                     for node_name, node_output in chunk.items():
                         current_node = node_name
-                        logger.info(f"[respond_stream] 节点更新 - {node_name}: {str(node_output)}")
-
-                        # 处理中断节点（可能出现再次人工干预）
-                        if node_name in {"__interrupt__", "interrupt", "graph:interrupt"}:
-                            interrupt_payload = None
-                            try:
-                                candidate = node_output[0] if isinstance(node_output, (list, tuple)) and node_output else node_output
-                                if hasattr(candidate, "value"):
-                                    interrupt_payload = candidate.value
-                                elif isinstance(candidate, dict) and "value" in candidate:
-                                    interrupt_payload = candidate.get("value")
-                            except Exception:
-                                interrupt_payload = None
-                            query = interrupt_payload.get("query") if isinstance(interrupt_payload, dict) else None
-                            if not query:
-                                query = "需要人工协助"
-                            yield f"data: {json.dumps({'type':'intervention_required','query':query,'thread_id':thread_id,'metadata':{'node':node_name}}, ensure_ascii=False)}\n\n"
-                            end_data = {'type':'end','content':'','metadata':{'total_chunks':chunk_count,'total_length':len(accumulated_content),'final_node':current_node}}
-                            yield f"data: {json.dumps(end_data)}\n\n"
+                        # str(node_output) 可能包含完整消息列表，只在 DEBUG 下格式化，且截断到 250 字符
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("[%s] 节点更新 - %s: %.250s", log_tag, node_name, node_output)
+
+                        # 人工干预：LangGraph 在 updates 流中以中断节点形式上报，不一定抛异常
+                        if node_name in _INTERRUPT_NODES:
+                            query = _extract_interrupt_query(node_output)
+
+                            logger.debug("[%s] 检测到中断节点，触发人工干预，query=%s", log_tag, query)
+                            intervention_event = {
+                                'type': 'intervention_required',
+                                'query': query,
+                                'thread_id': thread_id,
+                                'metadata': {'node': node_name}
+                            }
+                            yield encode_event(intervention_event)
+
+                            # 发送结束事件并退出流
+                            yield end_frame(chunk_count, accumulated_length, current_node)
                             return
 
                         if node_name == "tools":
+                            logger.debug("[%s] 🔧 工具节点正在执行...", log_tag)
                             if "messages" in node_output and node_output["messages"]:
                                 tool_message = node_output["messages"][-1]
                                 if hasattr(tool_message, 'content'):
-                                    tool_data = {'type':'tool_result','content':'🔧 工具执行完成','result':tool_message.content,'metadata':{'node':node_name}}
-                                    yield f"data: {json.dumps(tool_data)}\n\n"
+                                    logger.debug("[%s] ✅ 工具执行完成: %s", log_tag, tool_message.content)
+                                    tool_data = {
+                                        'type': 'tool_result',
+                                        'content': '🔧 工具执行完成',
+                                        'result': tool_message.content,
+                                        'metadata': {'node': node_name}
+                                    }
+                                    yield encode_event(tool_data)
 
                         elif node_name == "chatbot":
                             if "messages" in node_output and node_output["messages"]:
                                 ai_message = node_output["messages"][-1]
-                                if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls and not tool_decision_sent:
+                                tool_calls = getattr(ai_message, 'tool_calls', None)
+                                if tool_calls and not tool_decision_sent:
+                                    if logger.isEnabledFor(logging.DEBUG):
+                                        logger.debug("[%s] 🔍 AI决定调用工具: %s", log_tag, [tc.get('name', 'unknown') for tc in tool_calls])
                                     tool_decision_sent = True
-                                    decision_data = {'type':'ai_decision','content':'🤖 AI决定调用工具','metadata':{'node':node_name}}
-                                    yield f"data: {json.dumps(decision_data)}\n\n"
-                                    import asyncio
-                                    await asyncio.sleep(0.01)
-                                    for tool_call in ai_message.tool_calls:
-                                        tool_call_data = {
-                                            'type': 'tool_call',
-                                            'content': f"🔍 准备调用工具: {tool_call.get('name','unknown')}",
-                                            'tool_name': tool_call.get('name','unknown'),
-                                            'tool_args': tool_call.get('args', {}),
-                                            'metadata': {'node': node_name}
-                                        }
-                                        yield f"data: {json.dumps(tool_call_data)}\n\n"
-                                        await asyncio.sleep(0.01)
-
-            end_data = {'type':'end','content':'','metadata':{'total_chunks':chunk_count,'total_length':len(accumulated_content),'final_node':current_node}}
-            logger.info(f"[respond_stream] 流式恢复完成: {str(end_data)}")
-            yield f"data: {json.dumps(end_data)}\n\n"
-
-        except Exception as e:
-            logger.error(f"[respond_stream] 流式恢复失败: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
-
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
-        },
-    )
+                                    # 决策与全部工具调用合并为一个 ai_decision 事件，前端按 tool_calls 数组逐个展示
+                                    decision_data = {
+                                        'type': 'ai_decision',
+                                        'content': '🤖 AI决定调用工具',
+                                        'tool_calls': [
+                                            {
+                                                'tool_name': tool_call.get('name', 'unknown'),
+                                                'tool_args': tool_call.get('args', {}),
+                                            }
+                                            for tool_call in tool_calls
+                                        ],
+                                        'metadata': {'node': node_name}
+                                    }
+                                    logger.debug("[%s] 📤 发送AI决策事件: %s", log_tag, decision_data)
+                                    yield encode_event(decision_data)
+
+            # end 事件对齐 tool_routes.py
+            # 一次对话所有trunk输出后执行，可以输出token总数等等信息给前端展示
+            logger.info("[%s] 发送结束事件: total_chunks=%d, final_node=%s", log_tag, chunk_count, current_node)
+            yield end_frame(chunk_count, accumulated_length, current_node)
+        except GraphInterrupt as e:
+            # HITL: 捕获人工干预中断并通知前端
+            query = _extract_interrupt_query(e.interrupts)
+            logger.info("[%s] 触发人工干预，query=%s", log_tag, query)
+            yield encode_event({'type': 'intervention_required', 'query': query, 'thread_id': thread_id})
+
+    except Exception as e:
+        logger.error("[%s] 流式处理失败: %s", log_tag, e, exc_info=True)
+        yield encode_event({'type': 'error', 'error': str(e)})
+        logger.debug("[%s] 已发送 error 事件", log_tag)
+
+
+@router.get("/chat/stream")
+async def stream_chat_with_human_loop(message: str, thread_id: str = "default", debug: bool = False):
+    """
+    流式对话，支持人工干预。debug=true 时 content 事件附带完整的 LangGraph metadata。
+    """
+    logger.info("开始工具流式请求: thread_id=%s, message_len=%d", thread_id, len(message))
+    # initial_state 与 config
+    config = build_config(thread_id)
+    initial_state = {"messages": [{"role": "user", "content": message}]}
+    logger.debug("[stream_chat] 调用 graph.astream，initial_state=%s", initial_state)
+
+    # EventSourceResponse 自带 SSE 响应头（含 X-Accel-Buffering: no）与每 15s 的保活 ping；
+    # pump() 让图在独立任务中运行，客户端断开时取消生产端并关闭图的流
+    return EventSourceResponse(pump(_stream_graph(initial_state, config, thread_id, "stream_chat", debug)), ping=15)
+
+
+@router.get("/respond/stream")
+async def stream_respond_with_human_input(response: str, thread_id: str, debug: bool = False):
+    """
+    人工回复后，流式恢复图执行并返回最终AI回复（SSE）。
+    - 与 /human-loop/chat/stream 的事件结构保持一致：start/content/ai_decision(tool_calls)/tool_result/intervention_required/end/error
+    - 避免工具节点消息被拆分为多段：跳过 messages 流中的 tools 节点分片
+    """
+    logger.info("[respond_stream] 开始人工回复流式恢复: thread_id=%s, response_len=%d", thread_id, len(response))
+    config = build_config(thread_id)
+    human_command = Command(resume={"data": response})
+
+    # EventSourceResponse 自带 SSE 响应头（含 X-Accel-Buffering: no）与每 15s 的保活 ping；
+    # pump() 让图在独立任务中运行，客户端断开时取消生产端并关闭图的流
+    return EventSourceResponse(pump(_stream_graph(human_command, config, thread_id, "respond_stream", debug)), ping=15)
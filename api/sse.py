@@ -0,0 +1,109 @@
+"""Server-Sent Events (SSE) framing helpers shared by the streaming routes.
+
+Frames are produced as ``bytes`` so Starlette can send them as-is instead of
+re-encoding a ``str`` to UTF-8 for every streamed token.
+"""
+
+import asyncio
+from dataclasses import asdict, dataclass, field
+
+try:
+    # orjson 直接返回 bytes，比标准库 json 快得多
+    from orjson import dumps as _dumps
+except ImportError:
+    import json
+
+    def _dumps(obj) -> bytes:
+        # 与 orjson 输出保持一致：直接输出 UTF-8 且不带多余空格
+        return json.dumps(obj, default=asdict, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@dataclass(slots=True)
+class ContentMetadata:
+    """``metadata`` object of a streamed ``content`` event."""
+
+    node: str
+    chunk_number: int
+    accumulated_length: int
+
+
+@dataclass(slots=True)
+class ContentEvent:
+    """A single streamed token; serializes to the same JSON as the dict form."""
+
+    type: str = field(default="content", init=False)
+    content: str
+    metadata: ContentMetadata
+
+
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+
+
+def encode_event(obj) -> bytes:
+    """Serialize ``obj`` to JSON and wrap it in a single SSE ``data:`` frame."""
+    return _SSE_PREFIX + _dumps(obj) + _SSE_SUFFIX
+
+
+# 所有流式接口共用的固定 start 帧，模块加载时只编码一次
+START_FRAME = encode_event({'type': 'start', 'content': '', 'metadata': {'node': 'system', 'step': 0}})
+
+# end 帧只有统计字段会变化，用 bytes 模板填充，省去每次请求的 dict 构建
+_END_FRAME_TEMPLATE = b'data: {"type":"end","content":"","metadata":{"total_chunks":%d,"total_length":%d%s}}\n\n'
+
+# final_node 未传入时省略该字段（None 本身是合法的节点值，会编码为 null）
+_NO_NODE = object()
+
+
+def end_frame(total_chunks: int, total_length: int, final_node=_NO_NODE) -> bytes:
+    """Build the ``end`` frame carrying the stream totals and, if given, the last graph node."""
+    node_field = b"" if final_node is _NO_NODE else b',"final_node":' + _dumps(final_node)
+    return _END_FRAME_TEMPLATE % (total_chunks, total_length, node_field)
+
+
+_SENTINEL = object()
+
+
+async def pump(source, maxsize: int = 64):
+    """Drive ``source`` in a background task and yield its items from a bounded queue.
+
+    The producer keeps pulling from the graph while earlier frames are still being
+    written to the client; the bounded queue applies backpressure when the client
+    falls too far behind. Frames that are already queued are joined into a single
+    write. Errors raised by ``source`` are re-raised to the consumer.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def _produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as exc:
+            await queue.put(exc)
+        finally:
+            # 显式关闭源生成器，让 graph.astream 在客户端断开时立即停止，而不是等 GC 回收
+            await source.aclose()
+        # 被取消时不再放入哨兵：消费端已经退出，队列满时 put 会永久挂起
+        await queue.put(_SENTINEL)
+
+    producer = asyncio.create_task(_produce())
+    try:
+        item = await queue.get()
+        while item is not _SENTINEL:
+            if isinstance(item, Exception):
+                raise item
+            # 把已在队列中等待的帧合并成一次写出，减少 ASGI send 次数
+            batch = [item]
+            item = None
+            while not queue.empty():
+                nxt = queue.get_nowait()
+                if nxt is _SENTINEL or isinstance(nxt, Exception):
+                    item = nxt
+                    break
+                batch.append(nxt)
+            yield batch[0] if len(batch) == 1 else b"".join(batch)
+            if item is None:
+                item = await queue.get()
+    finally:
+        # 客户端断开时响应会取消消费端，这里同步取消生产端，避免图继续空跑
+        producer.cancel()
@@ -1,21 +1,177 @@
 """Tool API routes using LangGraph tool graph."""
 
-import json
 import logging
-import asyncio
 import contextlib
-from fastapi import APIRouter, Query
-from fastapi.responses import StreamingResponse
+import operator
+import re
+from dataclasses import dataclass
+from decimal import Decimal, localcontext
+from fastapi import APIRouter, HTTPException, Query
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from sse_starlette.sse import EventSourceResponse
 
+from api.common import build_config
+from api.sse import START_FRAME, ContentEvent, ContentMetadata, encode_event, end_frame, pump
 from graphs.tool_graph import graph as tool_graph
 
-# 设置日志
+# 设置日志（全局日志配置统一在 main.py 中完成）
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 router = APIRouter(prefix="/tool", tags=["tool"])
 
+# Graph stream modes a /tool/stream client may subscribe to via ``events``
+_STREAM_EVENTS = frozenset({"messages", "updates"})
+
+# A message that is nothing but "<number> <op> <number>" is answered directly;
+# going through the graph would cost two LLM round trips for one calculation
+_ARITHMETIC_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*([+\-*])\s*(-?\d+(?:\.\d+)?)\s*$")
+_ARITHMETIC_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul}
+
+
+def _initial_state(text: str) -> dict:
+    """Build the graph input for a single user message.
+
+    ``HumanMessage(content=...)`` is kept over ``model_construct``: with the
+    pinned langchain-core the validated constructor is the faster of the two.
+    A fresh message is needed per call because ``add_messages`` assigns its id
+    in place.
+    """
+    return {"messages": [HumanMessage(content=text)]}
+
+
+def _parse_number(text: str) -> int | Decimal:
+    # Decimals keep "0.1 + 0.2" exact instead of printing binary float noise
+    return Decimal(text) if "." in text else int(text)
+
+
+def _try_arithmetic(text: str) -> str | None:
+    """Return the answer for a bare ``a + b`` / ``a - b`` / ``a * b`` message, else ``None``.
+
+    Anything that can't be computed and printed exactly (e.g. operands past
+    Python's int/str digit limit) returns ``None`` so the graph handles it.
+    """
+    match = _ARITHMETIC_PATTERN.match(text)
+    if match is None:
+        return None
+    left, op, right = match.groups()
+    try:
+        # A sum or product never has more significant digits than both operands
+        # together, so this precision keeps Decimal results exact
+        with localcontext() as ctx:
+            ctx.prec = len(left) + len(right)
+            result = _ARITHMETIC_OPERATORS[op](_parse_number(left), _parse_number(right))
+        value = f"{result:f}" if isinstance(result, Decimal) else str(result)
+        return f"{left} {op} {right} = {value}"
+    except (ValueError, OverflowError):
+        return None
+
+
+async def _record_direct_answer(config: dict, initial_state: dict, answer: str) -> None:
+    """Write a turn answered without the LLM to the thread's checkpoint as a chatbot reply."""
+    initial_state["messages"].append(AIMessage(content=answer))
+    await tool_graph.aupdate_state(config, initial_state, as_node="chatbot")
+    logger.debug("Answered arithmetic message directly: %s", answer)
+
+
+async def warmup() -> None:
+    """Touch the tool graph once at startup so the first request doesn't pay the cold cost.
+
+    Reading the state of a throwaway thread validates the graph config and
+    initializes the checkpointer without calling the LLM; failures are only logged.
+    """
+    try:
+        await tool_graph.aget_state(build_config("__warmup__"))
+    except Exception:
+        logger.warning("[tool_routes][warmup] 预热失败", exc_info=True)
+
+
+@dataclass(slots=True)
+class _ToolStreamState:
+    """Per-request flags shared by the ``updates`` handlers of one stream."""
+
+    tool_decision_sent: bool = False  # 标记是否已发送AI决策事件
+
+
+async def _emit_tool_update(node_name: str, node_output: dict, state: _ToolStreamState):
+    """Yield the ``tool_result`` frame for a finished ``tools`` node."""
+    logger.debug("[tool_routes][updates][node=%s][ToolNode] 🔧 工具节点正在执行...", node_name)
+    messages = node_output.get("messages")
+    if not messages:
+        return
+    # ToolMessage（完整对象）
+    tool_message = messages[-1]
+    if logger.isEnabledFor(logging.DEBUG):
+        if isinstance(tool_message, ToolMessage):
+            logger.debug("[tool_routes][updates][node=%s][ToolMessage] ✅ 工具执行完成，content_len=%d",
+                         node_name, len(tool_message.content))
+        else:
+            logger.debug("[tool_routes][updates][node=%s][ToolMessage?] ✅ 工具执行完成，类型=%s", node_name, type(tool_message))
+    if hasattr(tool_message, 'content'):
+        tool_data = {
+            'type': 'tool_result',
+            'content': f"🔧 工具执行完成",
+            'result': tool_message.content,
+            'metadata': {'node': node_name}
+        }
+        yield encode_event(tool_data)
+
+
+async def _emit_chatbot_update(node_name: str, node_output: dict, state: _ToolStreamState):
+    """Yield the ``ai_decision`` and ``tool_call`` frames the first time the chatbot calls tools."""
+    # 决策事件每个请求只发送一次；之后的 chatbot 更新直接跳过，不再做任何探测与日志
+    if state.tool_decision_sent:
+        return
+    messages = node_output.get("messages")
+    if not messages:
+        return
+    # AIMessage（完整对象）
+    ai_message = messages[-1]
+    tool_calls = getattr(ai_message, 'tool_calls', None)
+
+    # 详细记录 AIMessage 信息（仅 DEBUG）
+    if logger.isEnabledFor(logging.DEBUG):
+        if isinstance(ai_message, AIMessage):
+            logger.debug("[tool_routes][updates][node=%s][AIMessage] 🤖 Chatbot节点返回AIMessage，content_len=%d",
+                         node_name, len(ai_message.content))
+        else:
+            logger.debug("[tool_routes][updates][node=%s][AIMessage?] 🤖 Chatbot节点返回消息，但类型=%s", node_name, type(ai_message))
+        for i, tc in enumerate(tool_calls or ()):
+            logger.debug("[tool_routes][updates][node=%s][AIMessage]   [%d] name=%s args=%s",
+                         node_name, i, tc.get('name', 'unknown'), tc.get('args', {}))
+
+    # Check if the message has tool calls
+    if not tool_calls:
+        return
+    # 标记已发送，避免重复
+    state.tool_decision_sent = True
+
+    # 发送AI决定调用工具的事件
+    decision_data = {
+        'type': 'ai_decision',
+        'content': '🤖 AI决定调用工具',
+        'metadata': {'node': node_name}
+    }
+    yield encode_event(decision_data)
+
+    # 发送每个工具调用的详细信息
+    for tool_call in tool_calls:
+        tool_call_data = {
+            'type': 'tool_call',
+            'content': f"🔍 准备调用工具: {tool_call.get('name', 'unknown')}",
+            'tool_name': tool_call.get('name', 'unknown'),
+            'tool_args': tool_call.get('args', {}),
+            'metadata': {'node': node_name}
+        }
+        logger.debug("[tool_routes][updates][node=%s][AIMessage] 📤 发送工具调用事件: %s", node_name, tool_call_data)
+        yield encode_event(tool_call_data)
+
+
+# updates 流中按节点名分发的处理函数，未列出的节点不向前端发送事件
+_UPDATE_HANDLERS = {
+    "tools": _emit_tool_update,
+    "chatbot": _emit_chatbot_update,
+}
+
 
 @router.get("/")
 async def tool_endpoint(
@@ -33,30 +189,50 @@ async def tool_endpoint(
     """
     try:
         # Create initial state with user message
-        initial_state = {
-            "messages": [HumanMessage(content=message)]
-        }
+        initial_state = _initial_state(message)
         
         # Create config with thread_id for conversation memory
-        config = {"configurable": {"thread_id": thread_id}}
+        config = build_config(thread_id)
         
-        logger.info(f"Invoking tool graph for message: '{message}' with thread_id: {thread_id}")
-        # Invoke the tool graph and get final result
-        result = await tool_graph.ainvoke(initial_state, config)
-        logger.info(f"Graph invocation finished. Final state: {result}")
-        
-        # Extract the assistant's response
-        assistant_message = result["messages"][-1]
+        answer = _try_arithmetic(message)
+        if answer is not None:
+            # 不经过 LLM，但仍把这一轮对话写入 checkpoint，保持会话历史完整
+            await _record_direct_answer(config, initial_state, answer)
+            snapshot = await tool_graph.aget_state(config)
+            return {
+                "success": True,
+                "response": answer,
+                "message_count": len(snapshot.values["messages"]),
+                "tools_used": [],
+                "used_tools": False
+            }
         
-        # Check if tools were used by looking at message history
+        logger.info("Invoking tool graph for message: '%.50s' with thread_id: %s", message, thread_id)
+        # Run the graph once: "updates" yields each node's new messages, so tool
+        # calls are collected as they happen; "values" carries the final state
+        result = None
         tool_calls_used = []
-        for msg in result["messages"]:
-            if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                for tool_call in msg.tool_calls:
+        async for stream_mode, chunk in tool_graph.astream(
+            initial_state,
+            config,
+            stream_mode=["updates", "values"]
+        ):
+            if stream_mode == "values":
+                result = chunk
+                continue
+            for node_output in chunk.values():
+                messages = node_output.get("messages") if isinstance(node_output, dict) else None
+                if not messages:
+                    continue
+                for tool_call in getattr(messages[-1], 'tool_calls', None) or ():
                     tool_calls_used.append({
                         "name": tool_call.get("name", "unknown"),
                         "args": tool_call.get("args", {})
                     })
+        logger.debug("Graph invocation finished: %d messages", len(result["messages"]))
+        
+        # Extract the assistant's response
+        assistant_message = result["messages"][-1]
         
         return {
             "success": True,
@@ -77,52 +253,68 @@ async def tool_endpoint(
 @router.get("/stream")
 async def tool_stream_endpoint(
     message: str = Query(..., description="User input message"),
-    thread_id: str = Query("default", description="Thread ID for conversation memory")
+    thread_id: str = Query("default", description="Thread ID for conversation memory"),
+    debug: bool = Query(False, description="Include raw LangGraph metadata in content events"),
+    events: str = Query("messages,updates", description="Comma-separated stream modes to forward: messages, updates")
 ):
     """
     Streaming tool endpoint using official LangGraph streaming with tool usage display.
     
     Query parameter:
     - message: user input text
+    - debug: attach the full LangGraph metadata to every content event
+    - events: "messages" streams tokens only; add "updates" for tool decision/result events
     
     Returns:
     - Server-Sent Events (SSE) stream of response tokens and tool info
     """
     
+    # 只订阅客户端需要的流模式：仅 messages 时 LangGraph 不再为每个节点产出完整的 updates 字典
+    stream_modes = list(dict.fromkeys(mode.strip() for mode in events.split(",") if mode.strip()))
+    if not stream_modes or not _STREAM_EVENTS.issuperset(stream_modes):
+        raise HTTPException(status_code=400, detail=f"events must be a comma-separated subset of {sorted(_STREAM_EVENTS)}")
+
     async def generate_tool_stream():
         try:
-            logger.info(f"[tool_routes][start] 开始工具流式请求: {message[:50]}...")
+            logger.info("[tool_routes][start] 开始工具流式请求: %.50s...", message)
             
             # Send start signal
-            start_data = {
-                'type': 'start', 
-                'content': '', 
-                'metadata': {'node': 'system', 'step': 0}
-            }
-            yield f"data: {json.dumps(start_data)}\n\n"
+            yield START_FRAME
             
             # Create initial state with user message
-            initial_state = {
-                "messages": [HumanMessage(content=message)]
-            }
-            logger.info(f"[tool_routes][init] 创建初始状态，消息数量: {len(initial_state['messages'])}")
+            initial_state = _initial_state(message)
+            logger.debug("[tool_routes][init] 创建初始状态，消息数量: %d", len(initial_state['messages']))
             
             # Use LangGraph's official streaming with multiple modes
-            logger.info("[tool_routes][stream] 使用 LangGraph 官方多模式流式输出: stream_mode=['messages','updates']")
+            logger.debug("[tool_routes][stream] 使用 LangGraph 官方多模式流式输出: stream_mode=%s", stream_modes)
             
-            accumulated_content = ""
+            # 只需要累计长度，不保留拼接后的完整文本
+            accumulated_length = 0
             chunk_count = 0
             current_node = None
-            tool_decision_sent = False  # 标记是否已发送AI决策事件
+            state = _ToolStreamState()
+            # 日志级别在一次请求内不会变化，只判断一次，逐 token 路径上不再调用 logger
+            log_tokens = logger.isEnabledFor(logging.DEBUG)
             
             # Create config with thread_id for conversation memory
-            config = {"configurable": {"thread_id": thread_id}}
+            config = build_config(thread_id)
+            
+            # 纯算术消息直接给出结果：与阻塞接口一致地写入 checkpoint，再按普通回复的帧结构输出
+            answer = _try_arithmetic(message)
+            if answer is not None:
+                await _record_direct_answer(config, initial_state, answer)
+                if "messages" in stream_modes:
+                    yield encode_event(ContentEvent(answer, ContentMetadata("chatbot", 1, len(answer))))
+                    yield end_frame(1, len(answer), "chatbot")
+                else:
+                    yield end_frame(0, 0, "chatbot")
+                return
             
             # Stream using LangGraph's official streaming API with multiple modes
             async for stream_mode, chunk in tool_graph.astream(
                 initial_state,
                 config,
-                stream_mode=["messages", "updates"]
+                stream_mode=stream_modes
             ):
                 # stream_mode="messages" 和 stream_mode="updates" 发回来的 数据粒度完全不同，因此两种日志看起来会很不一样——这正是官方设计的结果。
                 #
@@ -157,124 +349,61 @@ async def tool_stream_endpoint(
                     # Handle LLM token streaming
                     message_chunk, metadata = chunk
                     node_from_metadata = metadata.get('langgraph_node', 'unknown')
-                    # 统一的 messages 分支日志前缀
-                    prefix = f"[tool_routes][messages][node={node_from_metadata}]"
-                    logger.info(
-                        f"{prefix} chunk 到达: content='{getattr(message_chunk, 'content', '')}', has_tool_calls={hasattr(message_chunk, 'tool_calls')}")
+                    # messages 模式下的分片都是 BaseMessage 子类，content 必定存在
+                    content = message_chunk.content
+                    # 逐 token 日志只在 DEBUG 下格式化，避免热路径上的字符串拼接与 handler I/O
+                    if log_tokens:
+                        logger.debug("[tool_routes][messages][node=%s] chunk 到达: content=%r, has_tool_calls=%s",
+                                     node_from_metadata, content, bool(getattr(message_chunk, 'tool_calls', None)))
 
                     # 如果来自 ToolNode（tools 节点）的消息，则跳过，避免将工具返回值显示为 AI 回复
                     if node_from_metadata == "tools":
                         # 这是工具节点的 token 流（通常代表 ToolMessage 相关输出片段，工具tool node执行后的返回值），跳过显示，仅记录日志。
-                        logger.info(f"{prefix}[ToolMessageChunk][skip] 工具节点 chunk 已跳过，content='{getattr(message_chunk, 'content', '')}'")
+                        if log_tokens:
+                            logger.debug("[tool_routes][messages][node=%s][ToolMessageChunk][skip] 工具节点 chunk 已跳过", node_from_metadata)
                         continue
-                    if hasattr(message_chunk, 'content') and message_chunk.content:
+                    if content:
                         # 对于 chatbot 节点，这些 chunk 属于 AIMessage 的 token 级输出
-                        logger.info(f"{prefix}[AIMessageChunk] token='{message_chunk.content}'")
+                        if log_tokens:
+                            logger.debug("[tool_routes][messages][node=%s][AIMessageChunk] token=%r", node_from_metadata, content)
                         chunk_count += 1
-                        accumulated_content += message_chunk.content
+                        accumulated_length += len(content)
                         
                         # Send the streaming token
-                        chunk_data = {
-                            'type': 'content',
-                            'content': message_chunk.content,
-                            'metadata': {
-                                'node': metadata.get('langgraph_node', 'unknown'),
-                                'chunk_number': chunk_count,
-                                'accumulated_length': len(accumulated_content),
-                                'langgraph_metadata': metadata
+                        if debug:
+                            # 完整的 LangGraph metadata 体积远大于 token 本身，仅在调试时附带
+                            chunk_data = {
+                                'type': 'content',
+                                'content': content,
+                                'metadata': {
+                                    'node': node_from_metadata,
+                                    'chunk_number': chunk_count,
+                                    'accumulated_length': accumulated_length,
+                                    'langgraph_metadata': metadata
+                                }
                             }
-                        }
-                        yield f"data: {json.dumps(chunk_data)}\n\n"
-                        
+                        else:
+                            chunk_data = ContentEvent(
+                                content,
+                                ContentMetadata(node_from_metadata, chunk_count, accumulated_length),
+                            )
+                        yield encode_event(chunk_data)
+
                 elif stream_mode == "updates":
-                    # Handle node state updates
+                    # Handle node state updates: 按节点名分发给对应的处理函数
                     for node_name, node_output in chunk.items():
                         current_node = node_name
-                        prefix = f"[tool_routes][updates][node={node_name}]"
-                        logger.info(f"{prefix} 节点状态更新到达")
-                        
-                        if node_name == "tools":
-                            # Tool node execution
-                            logger.info(f"{prefix}[ToolNode] 🔧 工具节点正在执行...")
-                            if "messages" in node_output and node_output["messages"]:
-                                # ToolMessage（完整对象）
-                                tool_message = node_output["messages"][-1]
-                                if isinstance(tool_message, ToolMessage):
-                                    logger.info(f"{prefix}[ToolMessage] ✅ 工具执行完成，content_len={len(tool_message.content) if hasattr(tool_message, 'content') else 0}")
-                                else:
-                                    logger.info(f"{prefix}[ToolMessage?] ✅ 工具执行完成，类型={type(tool_message)}")
-                                if hasattr(tool_message, 'content'):
-                                    tool_data = {
-                                        'type': 'tool_result',
-                                        'content': f"🔧 工具执行完成",
-                                        'result': tool_message.content,
-                                        'metadata': {'node': node_name}
-                                    }
-                                    yield f"data: {json.dumps(tool_data)}\n\n"
-                        
-                        elif node_name == "chatbot":
-                            # Chatbot node - check for tool calls
-                            if "messages" in node_output and node_output["messages"]:
-                                # AIMessage（完整对象）
-                                ai_message = node_output["messages"][-1]
-
-                                # 详细记录 AIMessage 信息
-                                if isinstance(ai_message, AIMessage):
-                                    logger.info(f"{prefix}[AIMessage] 🤖 Chatbot节点返回AIMessage，content_len={len(ai_message.content) if hasattr(ai_message, 'content') else 0}")
-                                else:
-                                    logger.info(f"{prefix}[AIMessage?] 🤖 Chatbot节点返回消息，但类型={type(ai_message)}")
-                                logger.info(f"{prefix}[AIMessage] has_tool_calls={hasattr(ai_message, 'tool_calls') and bool(ai_message.tool_calls)}")
-                                if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls:
-                                    logger.info(f"{prefix}[AIMessage] tool_calls={[tc.get('name', 'unknown') for tc in ai_message.tool_calls]}")
-                                    for i, tc in enumerate(ai_message.tool_calls):
-                                        logger.info(f"{prefix}[AIMessage]   [{i}] name={tc.get('name', 'unknown')} args={tc.get('args', {})}")
-                                
-                                # Check if the message has tool calls and not already sent
-                                if hasattr(ai_message, 'tool_calls') and ai_message.tool_calls and not tool_decision_sent:
-                                    logger.info(f"{prefix}[AIMessage] 🔍 AI决定调用工具: {[tc.get('name', 'unknown') for tc in ai_message.tool_calls]}")
-                                    
-                                    # 标记已发送，避免重复
-                                    tool_decision_sent = True
-                                    
-                                    # 发送AI决定调用工具的事件
-                                    decision_data = {
-                                        'type': 'ai_decision',
-                                        'content': '🤖 AI决定调用工具',
-                                        'metadata': {'node': node_name}
-                                    }
-                                    logger.info(f"{prefix}[AIMessage] 📤 发送AI决策事件: {decision_data}")
-                                    yield f"data: {json.dumps(decision_data)}\n\n"
-                                    
-                                    # 稍微延迟以确保事件顺序
-                                    import asyncio
-                                    await asyncio.sleep(0.01)
-                                    
-                                    # 发送每个工具调用的详细信息
-                                    for tool_call in ai_message.tool_calls:
-                                        tool_call_data = {
-                                            'type': 'tool_call',
-                                            'content': f"🔍 准备调用工具: {tool_call.get('name', 'unknown')}",
-                                            'tool_name': tool_call.get('name', 'unknown'),
-                                            'tool_args': tool_call.get('args', {}),
-                                            'metadata': {'node': node_name}
-                                        }
-                                        logger.info(f"{prefix}[AIMessage] 📤 发送工具调用事件: {tool_call_data}")
-                                        yield f"data: {json.dumps(tool_call_data)}\n\n"
-                                        await asyncio.sleep(0.01)  # 小延迟确保事件顺序
+                        logger.debug("[tool_routes][updates][node=%s] 节点状态更新到达", node_name)
+                        handler = _UPDATE_HANDLERS.get(node_name)
+                        if handler is None or not isinstance(node_output, dict):
+                            continue
+                        async for frame in handler(node_name, node_output, state):
+                            yield frame
 
             
             # Send completion signal
-            end_data = {
-                'type': 'end',
-                'content': '',
-                'metadata': {
-                    'total_chunks': chunk_count,
-                    'total_length': len(accumulated_content),
-                    'final_node': current_node
-                }
-            }
-            yield f"data: {json.dumps(end_data)}\n\n"
-            logger.info(f"[tool_routes][end] 工具流式输出完成，总共 {chunk_count} 个 token，总长度: {len(accumulated_content)} 字符")
+            yield end_frame(chunk_count, accumulated_length, current_node)
+            logger.info("[tool_routes][end] 工具流式输出完成，总共 %d 个 token，总长度: %d 字符", chunk_count, accumulated_length)
             
         except Exception as e:
             # Send error signal
@@ -284,15 +413,10 @@ async def tool_stream_endpoint(
                 'content': error_msg, 
                 'metadata': {'node': 'system', 'error': True}
             }
-            yield f"data: {json.dumps(error_data)}\n\n"
-            logger.error(f"[tool_routes][error] 工具流式输出出错: {str(e)}", exc_info=True)
+            yield encode_event(error_data)
+            logger.error("[tool_routes][error] 工具流式输出出错: %s", e, exc_info=True)
     
-    return StreamingResponse(
-        generate_tool_stream(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Content-Type": "text/event-stream"
-        }
-    )
+    # EventSourceResponse sets the SSE headers (incl. X-Accel-Buffering: no) and sends a
+    # keep-alive ping every 15s; pump() runs the graph in its own task and, when the client
+    # disconnects, cancels it and closes the graph stream
+    return EventSourceResponse(pump(generate_tool_stream()), ping=15)
@@ -1,5 +1,7 @@
 """Configuration module for shared resources."""
 
-from .llm_config import llm
+from .checkpointer import BoundedInMemorySaver
+from .llm_config import llm, llm_semaphore
+from .search_cache import search_cache
 
-__all__ = ["llm"]
+__all__ = ["BoundedInMemorySaver", "llm", "llm_semaphore", "search_cache"]
@@ -0,0 +1,54 @@
+"""Bounded in-memory checkpointer for the graphs.
+
+``InMemorySaver`` keeps every thread's checkpoints for the lifetime of the
+process, so a long-running server grows without limit as new ``thread_id``s
+arrive. ``BoundedInMemorySaver`` keeps the same storage layout but tracks
+threads in least-recently-used order and drops the stalest thread once
+``max_threads`` is exceeded.
+"""
+
+from collections import OrderedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+# Default number of conversations kept in memory per graph
+DEFAULT_MAX_THREADS = 1000
+
+
+class BoundedInMemorySaver(InMemorySaver):
+    """``InMemorySaver`` that keeps at most ``max_threads`` threads (LRU).
+
+    The async methods of ``InMemorySaver`` delegate to the sync ones, so
+    overriding ``get_tuple``/``put``/``delete_thread`` covers both APIs.
+    """
+
+    def __init__(self, *, max_threads: int = DEFAULT_MAX_THREADS, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self._recent: OrderedDict[str, None] = OrderedDict()
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id in self._recent:
+            self._recent.move_to_end(thread_id)
+            return super().get_tuple(config)
+        result = super().get_tuple(config)
+        # ``storage`` is a defaultdict: reading an unknown thread leaves an empty
+        # entry behind, which would otherwise grow without bound as well
+        if result is None and not any(self.storage.get(thread_id, {}).values()):
+            self.storage.pop(thread_id, None)
+        return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        self._recent[thread_id] = None
+        self._recent.move_to_end(thread_id)
+        while len(self._recent) > self.max_threads:
+            stale_thread_id, _ = self._recent.popitem(last=False)
+            super().delete_thread(stale_thread_id)
+        return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._recent.pop(thread_id, None)
+        super().delete_thread(thread_id)
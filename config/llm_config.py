@@ -8,16 +8,37 @@ Environment variables (define in a `.env` file):
 - AZURE_OPENAI_KEY
 - AZURE_OPENAI_DEPLOYMENT (optional, default "gpt-4o-mini")
 - AZURE_OPENAI_API_VERSION (optional, default "2024-08-01-preview")
+- LLM_CONCURRENCY (optional, default 20): max LLM calls in flight per process
 """
 
+import asyncio
 import os
+
 from langchain_openai import AzureChatOpenAI
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+# One keep-alive connection pool per client type, shared by every graph through
+# ``llm`` and closed on application shutdown. The SDK's default clients keep its
+# timeouts, connection limits and redirect handling.
+http_client = DefaultHttpxClient()
+http_async_client = DefaultAsyncHttpxClient()
 
 # Global shared LLM instance
 llm = AzureChatOpenAI(
     azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
     openai_api_key=os.environ["AZURE_OPENAI_KEY"],
-    openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-    api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-08-01-preview"),
+    openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-08-01-preview"),
     deployment_name=os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-4o-mini"),
+    http_client=http_client,
+    http_async_client=http_async_client,
 )
+
+# Caps concurrent LLM calls across all graphs. Under a burst, extra requests wait
+# here instead of all hitting the provider at once and backing off on 429s.
+llm_semaphore = asyncio.Semaphore(int(os.environ.get("LLM_CONCURRENCY", "20")))
+
+
+async def close_http_clients() -> None:
+    """Close the shared HTTP connection pools; call once on application shutdown."""
+    await http_async_client.aclose()
+    http_client.close()
@@ -0,0 +1,55 @@
+"""Small TTL + LRU cache for web search results.
+
+A Baidu search is a network round trip of a second or more, and the same
+question is often asked several times in a row. Caching the formatted result
+for a short while answers repeats from memory. Entries are keyed by the
+normalized query and evicted in least-recently-used order once ``maxsize``
+is reached.
+"""
+
+import time
+from collections import OrderedDict
+
+# Default cache size and lifetime of a search result (seconds)
+DEFAULT_MAXSIZE = 1024
+DEFAULT_TTL = 600
+
+
+class SearchCache:
+    """In-process TTL cache with LRU eviction.
+
+    ``get``/``set`` never await, so they are safe to call from coroutines on
+    the event loop without an ``asyncio.Lock``.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: float = DEFAULT_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return query.strip().lower()
+
+    def get(self, query: str) -> str | None:
+        key = self.normalize(query)
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, query: str, value: str) -> None:
+        key = self.normalize(query)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+# Shared by every graph's search tool
+search_cache = SearchCache()
@@ -1,30 +1,21 @@
 """Simple LangGraph chat graph using Azure GPT-4o-mini.
 
-Environment variables (define in a `.env` file):
-- AZURE_OPENAI_ENDPOINT
-- AZURE_OPENAI_KEY
-- AZURE_OPENAI_DEPLOYMENT (optional, default "gpt-4o-mini")
-- AZURE_OPENAI_API_VERSION (optional, default "2024-08-01-preview")
+The Azure OpenAI client is the shared instance from ``config.llm_config``;
+see that module for the environment variables it reads.
 """
 
 from __future__ import annotations
 
-import os
+import logging
 from typing import Annotated, TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import InMemorySaver
-from langchain_openai import AzureChatOpenAI
 
+# Import shared LLM instance
+from config import BoundedInMemorySaver, llm, llm_semaphore
 
-# Initialize Azure OpenAI LLM with streaming enabled
-llm = AzureChatOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    openai_api_key=os.environ["AZURE_OPENAI_KEY"],
-    openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-08-01-preview"),
-    deployment_name=os.environ.get("AZURE_OPENAI_DEPLOYMENT", "gpt-4o-mini")
-)
+logger = logging.getLogger(__name__)
 
 
 class State(TypedDict):
@@ -32,17 +23,17 @@ class State(TypedDict):
     messages: Annotated[list, add_messages]
 
 
-def chatbot(state: State):
+async def chatbot(state: State):
     """LangGraph node: call Azure LLM.
     
     LangGraph will automatically handle streaming when using stream_mode="messages".
-    The framework will intercept and stream tokens from llm.invoke() calls.
+    The framework will intercept and stream tokens from llm.ainvoke() calls.
+    Being a coroutine, the node runs directly on the event loop instead of being
+    dispatched to a worker thread for every call.
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    response = llm.invoke(state["messages"])
-    logger.info(f"LLM invoke Response: {response.content}")
+    async with llm_semaphore:
+        response = await llm.ainvoke(state["messages"])
+    logger.info("LLM invoke Response: %s", response.content)
     
     return {"messages": [response]}
 
@@ -55,7 +46,7 @@ graph_builder.add_edge(START, "chatbot")
 graph_builder.add_edge("chatbot", END)
 
 # Initialize checkpoint/memory for conversation persistence
-memory = InMemorySaver()
+memory = BoundedInMemorySaver()
 
 # Compile the graph with checkpoint
 graph = graph_builder.compile(checkpointer=memory)
@@ -4,14 +4,14 @@ from langchain_core.messages import ToolMessage
 from langchain_core.tools import InjectedToolCallId, tool
 from typing_extensions import TypedDict
 
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import ToolNode
 from langgraph.types import Command, interrupt
 
-# Import LLM from existing module
-from .chat_graph import llm
+# Import shared LLM instance
+from config import BoundedInMemorySaver, llm, llm_semaphore
+from graphs.tools import baidu_search, route_tools
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
@@ -46,50 +46,12 @@ def human_assistance(
     }
     return Command(update=state_update)
 
-@tool
-def baidu_search(query: str) -> str:
-    """Search Baidu for current information and web results.
-    Use this when you need to find recent news, current events, or general web information.
-    This search tool works well in China network environment.
-    
-    Args:
-        query: The search query string
-    
-    Returns:
-        Search results as formatted text
-    """
-    try:
-        from baidusearch.baidusearch import search
-        
-        # Use Baidu search with max 5 results
-        results = search(query, num_results=5)
-        
-        if not results:
-            return f"No search results found for: {query}"
-        
-        # Format results
-        formatted_results = []
-        for i, result in enumerate(results, 1):
-            title = result.get('title', 'No title')
-            abstract = result.get('abstract', 'No description')
-            url = result.get('url', 'No URL')
-            
-            formatted_results.append(
-                f"{i}. **{title}**\n"
-                f"   {abstract}\n"
-                f"   URL: {url}\n"
-            )
-        
-        return "\n".join(formatted_results)
-        
-    except Exception as e:
-        return f"Baidu search failed due to: {str(e)}. Please try a different search query or try again later."
-
 tools = [baidu_search, human_assistance]
 llm_with_tools = llm.bind_tools(tools)
 
-def chatbot(state: State):
-    message = llm_with_tools.invoke(state["messages"])
+async def chatbot(state: State):
+    async with llm_semaphore:
+        message = await llm_with_tools.ainvoke(state["messages"])
     assert(len(message.tool_calls) <= 1)
     return {"messages": [message]}
 
@@ -101,10 +63,11 @@ graph_builder.add_node("tools", tool_node)
 
 graph_builder.add_conditional_edges(
     "chatbot",
-    tools_condition,
+    route_tools,
+    {"tools": "tools", END: END},
 )
 graph_builder.add_edge("tools", "chatbot")
 graph_builder.add_edge(START, "chatbot")
 
-memory = InMemorySaver()
+memory = BoundedInMemorySaver()
 graph = graph_builder.compile(checkpointer=memory)
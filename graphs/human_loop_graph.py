@@ -4,13 +4,13 @@ from typing_extensions import TypedDict
 from langchain_core.tools import tool
 from duckduckgo_search import DDGS
 
-from langgraph.checkpoint.memory import InMemorySaver
-from langgraph.graph import StateGraph, START
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import ToolNode
 from langgraph.types import Command, interrupt
 
-from config import llm
+from config import BoundedInMemorySaver, llm, llm_semaphore
+from graphs.tools import baidu_search, route_tools
 
 import logging
 logger = logging.getLogger(__name__)
@@ -22,60 +22,23 @@ class State(TypedDict):
 @tool
 def human_assistance(query: str) -> str:
     """Request assistance from a human."""
-    logger.info(f"[human_assistance] 请求人工协助: {query}")
+    logger.info("[human_assistance] 请求人工协助: %s", query)
     human_response = interrupt({"query": query})
-    logger.info(f"[human_assistance] 收到人工回复: {human_response.get('data')}")
+    logger.info("[human_assistance] 收到人工回复: %s", human_response.get('data'))
     return human_response["data"]
 
 
-@tool
-def baidu_search(query: str) -> str:
-    """Search Baidu for current information and web results.
-    Use this when you need to find recent news, current events, or general web information.
-    This search tool works well in China network environment.
-
-    Args:
-        query: The search query string
-
-    Returns:
-        Search results as formatted text
-    """
-    try:
-        from baidusearch.baidusearch import search
-
-        # Use Baidu search with max 5 results
-        results = search(query, num_results=5)
-
-        if not results:
-            return f"No search results found for: {query}"
-
-        # Format results
-        formatted_results = []
-        for i, result in enumerate(results, 1):
-            title = result.get('title', 'No title')
-            abstract = result.get('abstract', 'No description')
-            url = result.get('url', 'No URL')
-
-            formatted_results.append(
-                f"{i}. **{title}**\n"
-                f"   {abstract}\n"
-                f"   URL: {url}\n"
-            )
-
-        return "\n".join(formatted_results)
-
-    except Exception as e:
-        return f"Baidu search failed due to: {str(e)}. Please try a different search query or try again later."
-
 # 工具列表
 tools = [baidu_search, human_assistance]
 llm_with_tools = llm.bind_tools(tools)
 
-def chatbot(state: State):
-    logger.debug(f"[chatbot] 当前状态: {state}")
+async def chatbot(state: State):
     """聊天机器人节点"""
-    message = llm_with_tools.invoke(state["messages"])
-    logger.debug(f"[chatbot] LLM 返回消息: {message}")
+    # 惰性 % 格式化：DEBUG 关闭时不会把整个 state 转成字符串
+    logger.debug("[chatbot] 当前状态: %s", state)
+    async with llm_semaphore:
+        message = await llm_with_tools.ainvoke(state["messages"])
+    logger.debug("[chatbot] LLM 返回消息: %s", message)
     # 确保最多只有一个工具调用
     if hasattr(message, 'tool_calls') and len(message.tool_calls) > 1:
         logger.warning("[chatbot] 检测到多个工具调用，仅保留第一个")
@@ -95,11 +58,12 @@ graph_builder.add_node("tools", tool_node)
 # 添加边
 graph_builder.add_conditional_edges(
     "chatbot",
-    tools_condition,
+    route_tools,
+    {"tools": "tools", END: END},
 )
 graph_builder.add_edge("tools", "chatbot")
 graph_builder.add_edge(START, "chatbot")
 
 # 编译图（带内存）
-memory = InMemorySaver()
+memory = BoundedInMemorySaver()
 graph = graph_builder.compile(checkpointer=memory)
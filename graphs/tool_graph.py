@@ -1,8 +1,5 @@
-# 简单的 eager_start 修复
-import asyncio
-import warnings
-
 import os
+from datetime import datetime
 from typing import Annotated
 import logging
 
@@ -12,13 +9,15 @@ from typing_extensions import TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import ToolNode
 from langchain_tavily import TavilySearch
 from langchain_community.tools import DuckDuckGoSearchRun
 
 # Import shared LLM instance
-from config import llm
+from config import BoundedInMemorySaver, llm, llm_semaphore
+from graphs.tools import baidu_search, route_tools
+
+logger = logging.getLogger(__name__)
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
@@ -47,7 +46,6 @@ def calculate_square(number: float) -> float:
 @tool
 def get_current_time() -> str:
     """Get the current time."""
-    from datetime import datetime
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     return f"Current time is: {current_time}"
 
@@ -57,69 +55,33 @@ def get_current_time() -> str:
 #     max_results=2
 # )
 
-# Create a Baidu search tool for better China network compatibility
-@tool
-def baidu_search(query: str) -> str:
-    """Search Baidu for current information and web results.
-    Use this when you need to find recent news, current events, or general web information.
-    This search tool works well in China network environment.
-    
-    Args:
-        query: The search query string
-    
-    Returns:
-        Search results as formatted text
-    """
-    try:
-        from baidusearch.baidusearch import search
-        
-        # Use Baidu search with max 5 results
-        results = search(query, num_results=5)
-        
-        if not results:
-            return f"No search results found for: {query}"
-        
-        # Format results
-        formatted_results = []
-        for i, result in enumerate(results, 1):
-            title = result.get('title', 'No title')
-            abstract = result.get('abstract', 'No description')
-            url = result.get('url', 'No URL')
-            
-            formatted_results.append(
-                f"{i}. **{title}**\n"
-                f"   {abstract}\n"
-                f"   URL: {url}\n"
-            )
-        
-        return "\n".join(formatted_results)
-        
-    except Exception as e:
-        return f"Baidu search failed due to: {str(e)}. Please try a different search query or try again later."
-
 tools = [add_numbers, multiply_numbers, calculate_square, get_current_time, baidu_search]
 llm_with_tools = llm.bind_tools(tools)
 
-def chatbot(state: State):
+async def chatbot(state: State):
     """LangGraph chatbot node with tool calling capability.
     
     LangGraph will automatically handle streaming when using stream_mode="messages".
-    The framework will intercept and stream tokens from llm_with_tools.invoke() calls.
+    The framework will intercept and stream tokens from llm_with_tools.ainvoke() calls.
+    Being a coroutine, the node awaits the LLM on the event loop instead of holding
+    a worker thread for the whole request.
     """
-    logger = logging.getLogger(__name__)
-    logger.info("[tool_graph][chatbot][enter] 进入 chatbot 节点，准备调用 llm_with_tools.invoke()")
+    logger.info("[tool_graph][chatbot][enter] 进入 chatbot 节点，准备调用 llm_with_tools.ainvoke()")
     
-    response = llm_with_tools.invoke(state["messages"])
+    async with llm_semaphore:
+        response = await llm_with_tools.ainvoke(state["messages"])
     # 明确标注这是来自 tool_graph 的 AIMessage 完整返回
     content_len = len(response.content) if hasattr(response, 'content') else 0
-    logger.info(f"[tool_graph][chatbot][AIMessage] invoke 完成，content_len={content_len}")
+    logger.info("[tool_graph][chatbot][AIMessage] ainvoke 完成，content_len=%d", content_len)
     
     # Log tool calls if present
     if hasattr(response, 'tool_calls') and response.tool_calls:
-        names = [tc.get('name', 'unknown') for tc in response.tool_calls]
-        logger.info(f"[tool_graph][chatbot][AIMessage] 检测到工具调用请求: {names}")
-        for i, tc in enumerate(response.tool_calls):
-            logger.info(f"[tool_graph][chatbot][AIMessage]  tool_call[{i}] name={tc.get('name','unknown')} args={tc.get('args',{})}")
+        if logger.isEnabledFor(logging.INFO):
+            names = [tc.get('name', 'unknown') for tc in response.tool_calls]
+            logger.info("[tool_graph][chatbot][AIMessage] 检测到工具调用请求: %s", names)
+            for i, tc in enumerate(response.tool_calls):
+                logger.info("[tool_graph][chatbot][AIMessage]  tool_call[%d] name=%s args=%s",
+                            i, tc.get('name', 'unknown'), tc.get('args', {}))
     else:
         logger.info("[tool_graph][chatbot][AIMessage] 未请求工具调用（普通回答或继续生成）")
     
@@ -132,14 +94,15 @@ graph_builder.add_node("tools", tool_node)
 
 graph_builder.add_conditional_edges(
     "chatbot",
-    tools_condition,
+    route_tools,
+    {"tools": "tools", END: END},
 )
 # Any time a tool is called, we return to the chatbot to decide the next step
 graph_builder.add_edge("tools", "chatbot")
 graph_builder.add_edge(START, "chatbot")
 
 # Initialize checkpoint/memory for conversation persistence
-memory = InMemorySaver()
+memory = BoundedInMemorySaver()
 
 # Compile the graph with checkpoint
 graph = graph_builder.compile(checkpointer=memory)
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Tools and routing shared by several graphs.
+
+Defining each tool once means every graph binds the same tool object and
+shares one search cache.
+"""
+
+import asyncio
+
+from langchain_core.tools import tool
+from langgraph.graph import END
+
+from config import search_cache
+
+# One formatted search result: index, title, abstract, URL
+_RESULT_TEMPLATE = "%d. **%s**\n   %s\n   URL: %s\n"
+
+
+# Create a Baidu search tool for better China network compatibility
+@tool
+async def baidu_search(query: str) -> str:
+    """Search Baidu for current information and web results.
+    Use this when you need to find recent news, current events, or general web information.
+    This search tool works well in China network environment.
+
+    Args:
+        query: The search query string
+
+    Returns:
+        Search results as formatted text
+    """
+    # Repeated queries within the TTL are answered from memory
+    cached = search_cache.get(query)
+    if cached is not None:
+        return cached
+
+    try:
+        from baidusearch.baidusearch import search
+
+        # Use Baidu search with max 5 results; baidusearch does blocking HTTP,
+        # so run it in a worker thread to keep other streams on the event loop moving
+        results = await asyncio.to_thread(search, query, num_results=5)
+
+        if not results:
+            return f"No search results found for: {query}"
+
+        # Format results
+        formatted = "\n".join(
+            _RESULT_TEMPLATE % (
+                i,
+                result.get('title', 'No title'),
+                result.get('abstract', 'No description'),
+                result.get('url', 'No URL'),
+            )
+            for i, result in enumerate(results, 1)
+        )
+        search_cache.set(query, formatted)
+        return formatted
+
+    except Exception as e:
+        return f"Baidu search failed due to: {str(e)}. Please try a different search query or try again later."
+
+
+def route_tools(state: dict) -> str:
+    """Route ``chatbot`` to ``tools`` if the last AI message requested tools, otherwise end.
+
+    The chatbot always returns an AIMessage, so this skips the input-shape
+    checks the generic ``tools_condition`` does on every step.
+    """
+    return "tools" if state["messages"][-1].tool_calls else END
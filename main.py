@@ -10,22 +10,61 @@ project grows. Run `python main.py --help` to see available options.
 
 import argparse
 import logging
+import queue
 import sys
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI
 
 from dotenv import load_dotenv
 
 load_dotenv()  # ensure .env variables available before other imports
 
+# Configure logging once for the whole app; route modules only create loggers
+logging.basicConfig(level=logging.INFO)
+
 from api.chat_routes import router as chat_router
 from api.tool_routes import router as tool_router
+from api.tool_routes import warmup as tool_warmup
+from config.async_config import install_eager_task_factory
+from config.llm_config import close_http_clients
 from api.human_loop_routes import router as human_loop_router
 from api.customize_state_routes import router as customize_state_router
+from api.customize_state_routes import warmup as customize_state_warmup
 import uvicorn
 
 from fastapi.staticfiles import StaticFiles
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the log listener and warm up graphs before serving the first request."""
+    # 日志记录仍在事件循环线程上格式化（QueueHandler.prepare），只有最终的 stream 写入
+    # 交给 QueueListener 的后台线程，避免写终端/文件时的 handler 锁与 I/O 阻塞事件循环。
+    # 队列处理器与监听线程同时装上、同时撤下，未运行 lifespan 的进程日志照常直接写出
+    root_logger = logging.getLogger()
+    original_handlers = root_logger.handlers
+    log_listener = None
+    # 已经装过队列处理器时（同一进程再次进入 lifespan）不再叠加一层，否则日志会进入无人消费的队列
+    if not any(isinstance(handler, QueueHandler) for handler in original_handlers):
+        log_listener = QueueListener(queue.SimpleQueue(), *original_handlers, respect_handler_level=True)
+        log_listener.start()
+        root_logger.handlers = [QueueHandler(log_listener.queue)]
+    try:
+        # Python 3.12+ 上让同步即可完成的任务跳过一次事件循环调度
+        install_eager_task_factory()
+        await customize_state_warmup()
+        await tool_warmup()
+        yield
+    finally:
+        # 关闭 LLM 共享的 HTTP 连接池
+        await close_http_clients()
+        # 先恢复原处理器，再把队列中剩余的日志全部写出
+        if log_listener is not None:
+            root_logger.handlers = original_handlers
+            log_listener.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files (index.html, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -70,6 +109,16 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         version="%(prog)s 0.1.0",
         help="Show program version and exit.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of uvicorn worker processes (default: 1). Conversation "
+            "memory is kept in-process, so only use more than one worker "
+            "behind a load balancer with sticky sessions per thread_id."
+        ),
+    )
 
     return parser.parse_args(argv)
 
@@ -79,10 +128,17 @@ def main() -> None:
 
     Parses CLI arguments and starts the FastAPI server using uvicorn.
     """
-    # Parse CLI arguments (currently unused)
-    _ = parse_args()
-
-    uvicorn.run(app, host="0.0.0.0", port=8008, reload=False)
+    args = parse_args()
+
+    # uvloop（libuv 实现）降低流式接口大量小 await 的调度开销；Windows 不支持 uvloop
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    # httptools（C 实现的 HTTP 解析器）替代纯 Python 的 h11
+    # 多进程时 uvicorn 需要导入字符串，由每个 worker 进程各自导入并编译图
+    target = app if args.workers == 1 else "main:app"
+    uvicorn.run(
+        target, host="0.0.0.0", port=8008, reload=False,
+        workers=args.workers, loop=loop, http="httptools",
+    )
 
 
 if __name__ == "__main__":
@@ -26,6 +26,8 @@ class HumanLoopApp {
             <div class="decision-header">${data.content || '🤖 AI决定调用工具'}</div>
         `;
         contentDiv.appendChild(decisionDiv);
+        // 工具调用随 ai_decision 一并下发
+        (data.tool_calls || []).forEach(toolCall => this.addToolCallInfo(messageElement, toolCall));
     }
 
     addToolCallInfo(messageElement, toolData) {